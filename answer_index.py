@@ -0,0 +1,71 @@
+# answer_index.py
+from collections import deque
+
+# 全角/半角スペースを除去するための変換表（normalize と同じ規則）
+_STRIP_SPACES = str.maketrans("", "", " 　")
+
+
+def normalize(text: str) -> str:
+    """全角/半角スペースを除去して小文字化"""
+    return text.translate(_STRIP_SPACES).lower()
+
+
+class NameIndex:
+    """
+    正規化済みポケモン名の Aho-Corasick オートマトン。
+    メッセージを1回なめるだけで、含まれている全図鑑番号を取り出せる。
+    走査コストはメッセージ長にのみ依存し、登録名の数には依存しない。
+    """
+
+    def __init__(self, names: dict[int, str]):
+        # ノードは (遷移 dict, 失敗リンク, 出力IDのtuple) を並列リストで保持
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+
+        for pid, name in names.items():
+            key = normalize(name)
+            if not key:
+                continue
+            node = 0
+            for ch in key:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (pid,)
+
+        # BFSで失敗リンクを張り、出力を失敗先とマージ（部分一致名も拾うため）
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def find_ids(self, text: str) -> set[int]:
+        """text（正規化前）に含まれる全ポケモンの図鑑番号"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[int] = set()
+        node = 0
+        for ch in normalize(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def matches(self, text: str, answer: tuple[int, int]) -> bool:
+        """回答 (id1, id2) の両方の名前が text に含まれているか"""
+        found = self.find_ids(text)
+        return answer[0] in found and answer[1] in found
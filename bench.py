@@ -0,0 +1,615 @@
+# bench.py
+"""
+Discord に接続せずに Bot のホットパスを計測するベンチマーク／負荷リプレイ。
+
+偽の guild / channel / member と、遅延と 429 を再現する REST スタブの上で
+on_message・send_quiz・announce_winner・delete_range・VC期限スケジューラを動かし、
+処理件数/秒・ハンドラ遅延の分位点・REST 呼び出し数を表示する。
+
+    python bench.py --channels 50 --rate 20 --duration 10 --latency 0.05
+
+--member-startup を付けると、既定のメンバーキャッシュと LEAN_MEMBER_CACHE=1 の
+起動時間と RSS を偽の大規模サーバー（既定 1万人・10万人）で比較する。
+
+    python bench.py --member-startup --startup-members 10000 100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import discord
+from aiohttp import web
+
+from tracing import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 1x1 の PNG（画像ホストの代わりに返す）
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+
+
+def fmt_latency(samples) -> str:
+    return (
+        f"p50={percentile(samples, 0.50) * 1000:.2f}ms "
+        f"p95={percentile(samples, 0.95) * 1000:.2f}ms "
+        f"p99={percentile(samples, 0.99) * 1000:.2f}ms "
+        f"max={max(samples, default=0) * 1000:.2f}ms"
+    )
+
+
+# ========= REST スタブ =========
+class FakeREST:
+    """
+    REST 呼び出しの代わり。1回ごとに latency 秒待ち、(route, channel) ごとに
+    per 秒あたり limit 回を超えたら 429 を数えてバケットのリセットまで待つ
+    （discord.py がヘッダーに従って再試行するのと同じ振る舞い）。
+    """
+
+    def __init__(self, latency: float, limit: int, per: float):
+        self.latency = latency
+        self.limit = limit
+        self.per = per
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self._buckets: dict[tuple, list] = {}
+
+    async def call(self, route: str, major=None):
+        loop = asyncio.get_running_loop()
+        key = (route, major)
+        while self.limit:
+            now = loop.time()
+            bucket = self._buckets.get(key)
+            if bucket is None or now >= bucket[0]:
+                bucket = self._buckets[key] = [now + self.per, self.limit]
+            if bucket[1] > 0:
+                bucket[1] -= 1
+                break
+            self.rate_limited += 1
+            await asyncio.sleep(bucket[0] - now)
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def reset(self):
+        self.calls.clear()
+        self.rate_limited = 0
+
+
+# ========= 偽の Discord オブジェクト =========
+class FakeMember:
+    def __init__(self, guild, member_id: int, name: str):
+        self.guild = guild
+        self.id = member_id
+        self.display_name = name
+        self.mention = f"<@{member_id}>"
+        self.bot = False
+        self.roles = []
+        self.guild_permissions = discord.Permissions.all()
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content: str, created_at: datetime):
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.id = discord.utils.time_snowflake(created_at) + random.randint(0, 4000)
+
+    async def delete(self):
+        await self.channel.rest.call("delete_message", self.channel.id)
+        self.channel.messages.pop(self.id, None)
+
+
+def close_files(*files):
+    for file in files:
+        if file is not None:
+            file.close()
+
+
+class FakeTextChannel:
+    def __init__(self, guild, channel_id: int, rest: FakeREST):
+        self.guild = guild
+        self.id = channel_id
+        self.rest = rest
+        self.mention = f"<#{channel_id}>"
+        self.messages: dict[int, FakeMessage] = {}
+
+    async def send(self, content=None, *, embed=None, embeds=(), file=None, files=(), view=None):
+        close_files(file, *files)
+        await self.rest.call("send_message", self.id)
+
+    def permissions_for(self, member):
+        return SimpleNamespace(manage_messages=True, read_message_history=True)
+
+    async def history(self, *, limit=None, after=None, before=None, oldest_first=True):
+        def snowflake(x, high):
+            if x is None:
+                return (1 << 63) if high else 0
+            if isinstance(x, datetime):
+                return discord.utils.time_snowflake(x, high=high)
+            return x.id
+
+        lo, hi = snowflake(after, True), snowflake(before, False)
+        ids = sorted(i for i in self.messages if lo < i < hi)
+        for n, msg_id in enumerate(ids):
+            if n % 100 == 0:
+                await self.rest.call("history", self.id)  # 100件ごとに1ページ取得
+            msg = self.messages.get(msg_id)
+            if msg is not None:
+                yield msg
+
+    async def delete_messages(self, messages, *, reason=None):
+        await self.rest.call("bulk_delete", self.id)
+        for msg in messages:
+            self.messages.pop(msg.id, None)
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    """expire_private_vc の isinstance 判定を通すための VoiceChannel 派生（初期化は独自）"""
+
+    def __init__(self, guild, channel_id: int, rest: FakeREST, deadline: datetime, lateness: list):
+        self.guild = guild
+        self.id = channel_id
+        self._rest = rest
+        self._deadline = deadline
+        self._lateness = lateness
+
+    async def delete(self, *, reason=None):
+        self._lateness.append((datetime.now(timezone.utc) - self._deadline).total_seconds())
+        await self._rest.call("delete_channel", self.id)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, rest: FakeREST, member_count: int):
+        self.id = guild_id
+        self.rest = rest
+        self.members = {i: FakeMember(self, i, f"player{i}") for i in range(1, member_count + 1)}
+        self.cached = dict(self.members)  # ゲートウェイのメンバーキャッシュに載っている分
+        self.me = FakeMember(self, 0, "bot")
+        self.default_role = discord.Object(id=guild_id)
+        self.categories = []
+        self._next_channel = 60_000
+
+    async def create_voice_channel(self, name, *, overwrites=None, category=None, reason=None):
+        await self.rest.call("create_channel", self.id)
+        self._next_channel += 1
+        return FakeVoiceChannel(self, self._next_channel, self.rest, None, [])
+
+    def get_member(self, member_id: int):
+        return self.cached.get(member_id)
+
+    async def query_members(self, *, user_ids, limit, cache):
+        await self.rest.call("query_members")
+        return [self.members[i] for i in user_ids if i in self.members]
+
+    async def fetch_member(self, member_id: int):
+        await self.rest.call("fetch_member")
+        return self.members[member_id]
+
+
+class FakeResponse:
+    def __init__(self, rest: FakeREST):
+        self.rest = rest
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, *args, file=None, **kwargs):
+        close_files(file)
+        self._done = True
+        await self.rest.call("interaction_response")
+
+    async def defer(self, *args, **kwargs):
+        self._done = True
+        await self.rest.call("interaction_response")
+
+
+class FakeInteraction:
+    def __init__(self, channel, user, rest: FakeREST):
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id
+        self.user = user
+        self.rest = rest
+        self.response = FakeResponse(rest)
+        self.followup = SimpleNamespace(send=self._followup)
+        self.followups: list[str] = []
+
+    async def _followup(self, content=None, **kwargs):
+        self.followups.append(content)
+        await self.rest.call("followup")
+
+    async def edit_original_response(self, **kwargs):
+        await self.rest.call("edit_original_response")
+
+
+# ========= 画像ホストの代役 =========
+async def start_image_stub() -> tuple[web.AppRunner, int]:
+    async def image(request):
+        return web.Response(body=PNG, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/pokemon/fused/{id1}/{name}", image)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+
+# ========= シナリオ =========
+async def start_game(main, channel, players, seed: int):
+    # 出題順はシードで固定して、実行ごとに同じ問題列を再現する
+    game = main.GameState(owner_id=players[0].id, deck=main.QuestionDeck(seed + channel.id))
+    game.participants = {p.id for p in players}
+    game.active = True
+    main.games.setdefault(channel.guild.id, {})[channel.id] = game
+    main.save_game(channel.guild.id, channel.id)
+    await main.send_quiz(channel, game)
+
+
+async def bench_message_stream(main, guild, rest, args):
+    """args.channels 個のクイズに args.rate 件/秒のメッセージを流す"""
+    channels = [FakeTextChannel(guild, 10_000 + i, rest) for i in range(args.channels)]
+    players = list(guild.members.values())
+    latencies = []
+    processed = 0
+
+    async def drive(channel):
+        nonlocal processed
+        seated = random.sample(players, min(len(players), args.players))
+        interval = 1 / args.rate
+        deadline = time.perf_counter() + args.duration
+        next_at = time.perf_counter()
+        while time.perf_counter() < deadline:
+            game = main.get_game(guild.id, channel.id)
+            if game is None:
+                await start_game(main, channel, seated, args.seed)
+                game = main.get_game(guild.id, channel.id)
+            author = random.choice(seated)
+            if game.current_answer is not None and random.random() < args.correct:
+                a, b = game.current_answer
+                content = f"{main.POKEDEX[a]} {main.POKEDEX[b]}"
+            else:
+                content = random.choice(("なんだろう", "わからん", "ピカチュウ？", "ヒント欲しい"))
+            msg = FakeMessage(channel, author, content, datetime.now(timezone.utc))
+            start = time.perf_counter()
+            await main.bot.on_message(msg)
+            latencies.append(time.perf_counter() - start)
+            processed += 1
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    rest.reset()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(drive(ch) for ch in channels))
+    elapsed = time.perf_counter() - t0
+    # 残っている正解処理（アクター）を流し切る
+    await asyncio.sleep(args.latency * 4 + 0.5)
+    for channel in channels:
+        main.end_game(guild.id, channel.id)
+
+    print(f"[on_message] {processed} msgs in {elapsed:.2f}s -> {processed / elapsed:.0f} msgs/s "
+          f"({args.channels} channels x {args.rate} msgs/s)")
+    print(f"  handler latency: {fmt_latency(latencies)}")
+    print(f"  REST: {dict(rest.calls)}  429s: {rest.rate_limited}")
+
+
+async def bench_send_quiz(main, guild, rest, args):
+    channel = FakeTextChannel(guild, 20_000, rest)
+    players = list(guild.members.values())[: args.players]
+    await start_game(main, channel, players, args.seed)
+    game = main.get_game(guild.id, channel.id)
+    rest.reset()
+    latencies = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        await main.send_quiz(channel, game)
+        latencies.append(time.perf_counter() - start)
+    main.end_game(guild.id, channel.id)
+    print(f"[send_quiz] {args.iterations} questions: {fmt_latency(latencies)}")
+    print(f"  REST: {dict(rest.calls)}")
+
+
+async def bench_announce_winner(main, member_names, guild, rest, args):
+    channel = FakeTextChannel(guild, 30_000, rest)
+    game = main.GameState(owner_id=1)
+    scores = {m.id: random.randint(0, 10) for m in list(guild.members.values())[:40]}
+    game.board = main.RankedBoard(scores)
+    # 半分はメンバーキャッシュにいない（ゲートウェイ/REST で引く）想定
+    for uid in list(scores)[::2]:
+        guild.cached.pop(uid, None)
+    member_names.NAME_CACHE.clear()
+    rest.reset()
+    latencies = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        await main.announce_winner(channel, game)
+        latencies.append(time.perf_counter() - start)
+    guild.cached.update(guild.members)
+    print(f"[announce_winner] 40 scorers x {args.iterations}: {fmt_latency(latencies)}")
+    print(f"  REST: {dict(rest.calls)}")
+
+
+async def bench_delete_range(main, guild, rest, args):
+    channel = FakeTextChannel(guild, 40_000, rest)
+    author = guild.get_member(1)
+    now = datetime.now(timezone.utc)
+    # 半分は14日より前（個別削除）、半分は直近（一括削除）
+    for i in range(args.messages):
+        age = timedelta(days=20) if i < args.messages // 2 else timedelta(days=1)
+        msg = FakeMessage(channel, author, "log", now - age - timedelta(seconds=i))
+        channel.messages[msg.id] = msg
+    start = (now - timedelta(days=30)).astimezone(main.JST).strftime("%Y-%m-%d-%H:%M")
+    end = (now + timedelta(minutes=1)).astimezone(main.JST).strftime("%Y-%m-%d-%H:%M")
+    interaction = FakeInteraction(channel, author, rest)
+    rest.reset()
+    t0 = time.perf_counter()
+    await main.delete_range.callback(interaction, f"{start}～{end}")
+    elapsed = time.perf_counter() - t0
+    print(f"[delete_range] {args.messages - len(channel.messages)}/{args.messages} deleted in {elapsed:.2f}s "
+          f"-> {(args.messages - len(channel.messages)) / elapsed:.0f} msgs/s")
+    print(f"  REST: {dict(rest.calls)}  429s: {rest.rate_limited}")
+
+
+async def bench_delete_range_multi(main, guild, rest, args):
+    """args.purge_channels 個のチャンネルに分散した args.messages 件をサーバー全体モードで削除"""
+    author = guild.get_member(1)
+    now = datetime.now(timezone.utc)
+    channels = [FakeTextChannel(guild, 45_000 + i, rest) for i in range(args.purge_channels)]
+    for i in range(args.messages):
+        channel = channels[i % len(channels)]
+        age = timedelta(days=20) if i % 4 == 0 else timedelta(days=1)
+        msg = FakeMessage(channel, author, "log", now - age - timedelta(seconds=i))
+        channel.messages[msg.id] = msg
+    guild.text_channels = channels
+    start = (now - timedelta(days=30)).astimezone(main.JST).strftime("%Y-%m-%d-%H:%M")
+    end = (now + timedelta(minutes=1)).astimezone(main.JST).strftime("%Y-%m-%d-%H:%M")
+    interaction = FakeInteraction(channels[0], author, rest)
+    rest.reset()
+    t0 = time.perf_counter()
+    await main.delete_range.callback(interaction, f"{start}～{end}", all_channels=True)
+    elapsed = time.perf_counter() - t0
+    deleted = args.messages - sum(len(ch.messages) for ch in channels)
+    print(f"[delete_range all_channels] {deleted}/{args.messages} deleted across {len(channels)} channels "
+          f"in {elapsed:.2f}s -> {deleted / elapsed:.0f} msgs/s")
+    print(f"  REST: {dict(rest.calls)}  429s: {rest.rate_limited}")
+
+
+async def bench_vc_batch(main, guild, rest, args):
+    """args.batch_rooms 行の CSV で create_private_vc_batch を動かす"""
+    category = SimpleNamespace(id=main.GUILD_CONFIGS.get(guild.id).vc_category_id, channels=[])
+    guild.categories = [category]
+    now = datetime.now(main.JST)
+    period = f"{now:%Y-%m-%d-%H:%M}～{now + timedelta(days=1):%Y-%m-%d-%H:%M}"
+    csv_text = "user_id,period\n" + "".join(f"{uid},{period}\n" for uid in list(guild.members)[: args.batch_rooms])
+
+    async def read():
+        return csv_text.encode()
+
+    interaction = FakeInteraction(FakeTextChannel(guild, 55_000, rest), guild.get_member(1), rest)
+    rest.reset()
+    t0 = time.perf_counter()
+    await main.create_private_vc_batch.callback(interaction, SimpleNamespace(read=read))
+    elapsed = time.perf_counter() - t0
+    created = [key for key in main.guild_vcs(guild.id) if key > 60_000]
+    for ch_id in created:
+        main.VC_SCHEDULER.cancel((guild.id, ch_id))
+        main.guild_vcs(guild.id).pop(ch_id)
+    print(f"[vc batch] {len(created)}/{args.batch_rooms} rooms created in {elapsed:.2f}s")
+    print(f"  report: {interaction.followups[-1].splitlines()[0]}")
+    print(f"  REST: {dict(rest.calls)}  429s: {rest.rate_limited}")
+
+
+async def bench_vc_expiry(main, guild, rest, args):
+    lateness: list[float] = []
+    now = datetime.now(timezone.utc)
+    channels = {}
+    for i in range(args.vcs):
+        deadline = now + timedelta(seconds=random.uniform(0.5, 2.5))
+        ch = FakeVoiceChannel(guild, 50_000 + i, rest, deadline, lateness)
+        channels[ch.id] = ch
+        main.guild_vcs(guild.id)[ch.id] = {"owner_id": 1, "start": now, "end": deadline}
+        main.VC_SCHEDULER.schedule((guild.id, ch.id), deadline)
+    main.bot.get_channel = channels.get
+    rest.reset()
+    main.VC_SCHEDULER.start()
+    await asyncio.sleep(3.0 + args.latency * args.vcs / 5)
+    print(f"[vc expiry] {len(lateness)}/{args.vcs} rooms deleted, lateness {fmt_latency(lateness)}")
+    print(f"  REST: {dict(rest.calls)}  remaining scheduled: {len(main.VC_SCHEDULER)}")
+
+
+# ========= 起動時のメンバー取得（省メモリモードとの比較） =========
+MEMBER_JSON = (
+    '{"user":{"id":"%d","username":"player%d","discriminator":"0","global_name":null,"avatar":null},'
+    '"roles":[],"joined_at":"2024-01-01T00:00:00+00:00","deaf":false,"mute":false,"nick":null,"flags":0}'
+)
+CHUNK_SIZE = 1000  # GUILD_MEMBERS_CHUNK 1回あたりの人数
+
+
+def current_rss() -> int:
+    """現在の常駐メモリ（バイト）。Linux の /proc から読む"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def guild_create_payload(guild_id: int, member_count: int) -> dict:
+    # 大規模サーバーの GUILD_CREATE に載るメンバーは Bot 自身（と VC 接続中の人）だけ
+    return {
+        "id": str(guild_id),
+        "name": "bench",
+        "owner_id": "1",
+        "member_count": member_count + 1,
+        "large": True,
+        "unavailable": False,
+        "members": [json.loads(MEMBER_JSON % (1, 1))],
+        "roles": [{
+            "id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0,
+            "color": 0, "hoist": False, "managed": False, "mentionable": False,
+        }],
+        "channels": [], "threads": [], "voice_states": [], "presences": [], "emojis": [], "stickers": [],
+        "features": [], "stage_instances": [], "guild_scheduled_events": [],
+    }
+
+
+async def measure_startup(main, member_count: int) -> dict:
+    """
+    偽の GUILD_CREATE と 1000人ずつのメンバーチャンクを discord.py の ConnectionState に流し、
+    サーバーが使えるようになる（guild_join が出る）までの時間と RSS の増分を測る。
+    ゲートウェイの通信時間は含まない（JSON デコードとキャッシュ構築のみ）。
+    """
+    state = main.bot._connection
+    state.loop = asyncio.get_running_loop()
+    state.user = discord.ClientUser(state=state, data={"id": "1", "username": "bot", "discriminator": "0", "avatar": None})
+    guild_id = main.GUILD_ID
+
+    async def chunker(guild_id, query="", limit=0, presences=False, *, nonce=None, shard_id=None):
+        async def deliver():
+            count = -(-member_count // CHUNK_SIZE)
+            for index in range(count):
+                ids = range(2 + index * CHUNK_SIZE, 2 + min(member_count, (index + 1) * CHUNK_SIZE))
+                payload = '{"guild_id":"%d","nonce":"%s","chunk_index":%d,"chunk_count":%d,"members":[%s]}' % (
+                    guild_id, nonce, index, count, ",".join(MEMBER_JSON % (i, i) for i in ids)
+                )
+                state.parse_guild_members_chunk(json.loads(payload))
+                await asyncio.sleep(0)
+
+        asyncio.create_task(deliver())
+
+    ready = asyncio.Event()
+
+    def dispatch(event, *args):
+        if event in ("guild_join", "guild_available"):
+            ready.set()
+
+    state.chunker = chunker
+    state.dispatch = dispatch
+    gc.collect()
+    base = current_rss()
+    t0 = time.perf_counter()
+    state.parse_guild_create(guild_create_payload(guild_id, member_count))
+    await ready.wait()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    return {
+        "ready": elapsed,
+        "rss": current_rss() - base,
+        "cached": len(main.bot.get_guild(guild_id).members),
+    }
+
+
+def bench_member_startup(args):
+    """既定モードと LEAN_MEMBER_CACHE=1 を、それぞれ別プロセスで計測して並べる"""
+    for member_count in args.startup_members:
+        for lean in ("0", "1"):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--startup-child", str(member_count)],
+                env=dict(os.environ, LEAN_MEMBER_CACHE=lean),
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            mode = "lean" if lean == "1" else "default"
+            print(f"[member startup] {member_count:>7} members {mode:<7}: ready {result['ready'] * 1000:7.1f}ms  "
+                  f"RSS +{result['rss'] / 2**20:6.1f}MiB  cached members {result['cached']}")
+
+
+def import_main(image_base: str):
+    """一時ディレクトリのストア／画像キャッシュを向くように環境変数を設定してから main を読み込む"""
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    os.environ["FUSION_IMAGE_BASE"] = image_base
+    os.environ["BOT_STATE_DB"] = os.path.join(workdir, "state.db")
+    os.environ["IMAGE_CACHE_DIR"] = os.path.join(workdir, "images")
+    os.chdir(HERE)
+    sys.path.insert(0, HERE)
+    import main
+    return main
+
+
+async def startup_child(member_count: int):
+    main = import_main("http://127.0.0.1:9")
+    print(json.dumps(await measure_startup(main, member_count)))
+    main.STORE.close()
+
+
+async def run(args):
+    random.seed(args.seed)
+    runner, port = await start_image_stub()
+    main = import_main(f"http://127.0.0.1:{port}")
+    import member_names
+
+    async def no_commands(message):
+        pass
+
+    main.bot.process_commands = no_commands  # プレフィックスコマンドは計測対象外
+    main.STORE.start()
+
+    rest = FakeREST(args.latency, args.limit, args.per)
+    guild = FakeGuild(main.GUILD_ID, rest, args.members)
+    try:
+        await bench_message_stream(main, guild, rest, args)
+        await bench_send_quiz(main, guild, rest, args)
+        await bench_announce_winner(main, member_names, guild, rest, args)
+        await bench_delete_range(main, guild, rest, args)
+        await bench_delete_range_multi(main, guild, rest, args)
+        await bench_vc_batch(main, guild, rest, args)
+        await bench_vc_expiry(main, guild, rest, args)
+    finally:
+        main.VC_SCHEDULER.stop()
+        await main.IMAGE_CACHE.close()
+        main.STORE.close()
+        await runner.cleanup()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=50, help="同時に動かすクイズチャンネル数")
+    parser.add_argument("--rate", type=float, default=20, help="1チャンネルあたりのメッセージ数/秒")
+    parser.add_argument("--duration", type=float, default=10, help="メッセージ流入を続ける秒数")
+    parser.add_argument("--players", type=int, default=8, help="1クイズあたりの参加者数")
+    parser.add_argument("--correct", type=float, default=0.05, help="メッセージが正解である確率")
+    parser.add_argument("--members", type=int, default=200, help="偽 guild のメンバー数")
+    parser.add_argument("--latency", type=float, default=0.05, help="REST 1回あたりの遅延（秒）")
+    parser.add_argument("--limit", type=int, default=0, help="レート制限：per 秒あたりの回数（0で無制限）")
+    parser.add_argument("--per", type=float, default=5.0, help="レート制限のリセット間隔（秒）")
+    parser.add_argument("--iterations", type=int, default=20, help="send_quiz / announce_winner の反復回数")
+    parser.add_argument("--messages", type=int, default=2000, help="delete_range で削除する件数")
+    parser.add_argument("--purge-channels", type=int, default=8, help="サーバー全体削除で使うチャンネル数")
+    parser.add_argument("--batch-rooms", type=int, default=40, help="一括作成するプライベートVCの数")
+    parser.add_argument("--vcs", type=int, default=200, help="期限を迎えるプライベートVCの数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--member-startup", action="store_true", help="起動時のメンバー取得だけを既定／省メモリモードで比較する")
+    parser.add_argument("--startup-members", type=int, nargs="+", default=[10_000, 100_000], help="比較するサーバーの人数")
+    parser.add_argument("--startup-child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.startup_child is not None:
+        asyncio.run(startup_child(args.startup_child))
+    elif args.member_startup:
+        bench_member_startup(args)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,41 @@
+# channel_actor.py
+import asyncio
+import logging
+
+import tracing
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ChannelActor:
+    """
+    1チャンネル分のイベントを自前のキューで1件ずつ順番に処理するアクター。
+    同じチャンネル内の処理は直列になり、別チャンネルのアクターとは並行して動く。
+    """
+
+    def __init__(self, handler):
+        self.handler = handler  # async def (*args) -> None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def submit(self, *args):
+        self._queue.put_nowait(args)
+        if self._task is None or self._task.done():
+            self._task = tracing.spawn(self._run())
+
+    def close(self):
+        """キューに残っている分を処理し終えたら停止する"""
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(_STOP)
+
+    async def _run(self):
+        while True:
+            args = await self._queue.get()
+            if args is _STOP:
+                return
+            try:
+                await self.handler(*args)
+            except Exception:
+                log.exception("channel actor handler failed")
@@ -0,0 +1,111 @@
+# expiry_scheduler.py
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+
+import tracing
+
+log = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """
+    期限付きオブジェクトの満了処理スケジューラ。
+    最小ヒープで期限を管理し、1本のタスクが「次の期限」まで眠るだけなので、
+    予定がない間は一切起きない。期限の変更は再登録するだけ（古い項目は遅延破棄）。
+    満了処理が例外で失敗した項目は、retry_base 秒から倍々に（最大 retry_max 秒）間隔を空けて再実行する。
+    """
+
+    def __init__(self, on_expire, *, concurrency: int = 5, retry_base: float = 30.0, retry_max: float = 3600.0):
+        self.on_expire = on_expire  # async def (key) -> None
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._heap: list[tuple[float, int, object]] = []
+        self._deadlines: dict[object, float] = {}
+        self._seq = 0  # 同時刻の項目の比較用
+        self._wakeup = asyncio.Event()
+        self._sem = asyncio.Semaphore(concurrency)
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self._failures: dict[object, int] = {}  # 連続して満了処理に失敗した回数
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, key, when: datetime):
+        """key の期限を when に設定（既存なら上書き）"""
+        ts = when.timestamp()
+        self._deadlines[key] = ts
+        self._seq += 1
+        heapq.heappush(self._heap, (ts, self._seq, key))
+        # 先頭が変わった時だけ眠っているタスクを起こす
+        if self._heap[0][1] == self._seq:
+            self._wakeup.set()
+        self._compact()
+
+    def schedule_many(self, items):
+        """(key, when) の組をまとめて登録する（ヒープは1回で組み直し、起こすのも1回だけ）"""
+        head = self._heap[0] if self._heap else None
+        for key, when in items:
+            ts = when.timestamp()
+            self._deadlines[key] = ts
+            self._seq += 1
+            self._heap.append((ts, self._seq, key))
+        heapq.heapify(self._heap)
+        if self._heap and self._heap[0] != head:
+            self._wakeup.set()
+        self._compact()
+
+    def cancel(self, key):
+        """key の期限を取り消す（ヒープ上の項目は取り出し時に捨てる）"""
+        self._deadlines.pop(key, None)
+        self._failures.pop(key, None)
+        self._compact()
+
+    def _compact(self):
+        # 上書き・取り消しで溜まった古い項目が増えすぎたら作り直す
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [e for e in self._heap if self._deadlines.get(e[2]) == e[0]]
+            heapq.heapify(self._heap)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = tracing.spawn(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now(timezone.utc).timestamp()
+            while self._heap and self._heap[0][0] <= now:
+                ts, _, key = heapq.heappop(self._heap)
+                if self._deadlines.get(key) != ts:
+                    continue  # 取り消し済み、または期限が変更された古い項目
+                del self._deadlines[key]
+                task = asyncio.create_task(self._fire(key))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key):
+        async with self._sem:
+            try:
+                await self.on_expire(key)
+            except Exception:
+                # 1件の失敗で他の満了処理を止めず、その項目だけ間隔を空けてやり直す
+                failures = self._failures[key] = self._failures.get(key, 0) + 1
+                delay = min(self.retry_base * 2 ** (failures - 1), self.retry_max)
+                log.exception("expiry of %r failed (attempt %d), retrying in %.0fs", key, failures, delay)
+                if key not in self._deadlines:  # 処理中に期限が再設定されていればそちらを優先
+                    self.schedule(key, datetime.now(timezone.utc) + timedelta(seconds=delay))
+            else:
+                self._failures.pop(key, None)
@@ -0,0 +1,194 @@
+# fusion_images.py
+import asyncio
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+import aiohttp
+
+import tracing
+
+log = logging.getLogger(__name__)
+
+# 画像ホスト（テスト時は環境変数でローカルのHTTPサーバーに差し替え可能）
+IMAGE_BASE = os.environ.get("FUSION_IMAGE_BASE", "https://images.alexonsager.net")
+
+
+# 連続してこの回数だけ使えない組み合わせを引いたら、出題できる問題がないとみなす
+MAX_BAD_DRAWS = 1000
+
+
+class NoQuestionError(Exception):
+    """山札の条件に合う組み合わせが、すべて画像を取得できないものだった"""
+
+
+def fusion_url(id1: int, id2: int) -> str:
+    return f"{IMAGE_BASE}/pokemon/fused/{id1}/{id1}.{id2}.png"
+
+
+class ImageCache:
+    """
+    フュージョン画像のディスクキャッシュ（合計サイズ上限つき LRU）。
+    取得できなかった組み合わせは bad_pairs.txt に記録し、以降は出題しない。
+    同じ画像の取得が重なった時は、最初の1回のダウンロードを全員で待つ。
+    """
+
+    def __init__(self, directory: str = "image_cache", max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._bad_path = os.path.join(directory, "bad_pairs.txt")
+        self.bad: set[tuple[int, int]] = set()
+        if os.path.exists(self._bad_path):
+            with open(self._bad_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    a, _, b = line.strip().partition(".")
+                    if a and b:
+                        self.bad.add((int(a), int(b)))
+
+        # 既存ファイルを更新日時の古い順に並べて LRU を復元
+        entries = [e for e in os.scandir(directory) if e.name.endswith(".png")]
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        self._files: OrderedDict[str, int] = OrderedDict((e.name, e.stat().st_size) for e in entries)
+        self._total = sum(self._files.values())
+        self._session: aiohttp.ClientSession | None = None
+        self._inflight: dict[str, asyncio.Task] = {}  # 取得中のファイル名 → ダウンロード
+
+    def path_for(self, id1: int, id2: int) -> str:
+        return os.path.join(self.directory, f"{id1}.{id2}.png")
+
+    async def fetch(self, id1: int, id2: int) -> str | None:
+        """画像のローカルパスを返す（キャッシュになければ取得）。取得できなければ None"""
+        name = f"{id1}.{id2}.png"
+        if name in self._files:
+            self._files.move_to_end(name)
+            return self.path_for(id1, id2)
+        task = self._inflight.get(name)
+        if task is None:
+            task = self._inflight[name] = asyncio.create_task(self._download(id1, id2))
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        # 待っている1ゲームが止まっても、同じ画像を待つ他のゲームの取得は続ける
+        return await asyncio.shield(task)
+
+    async def _download(self, id1: int, id2: int) -> str | None:
+        name = f"{id1}.{id2}.png"
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        try:
+            async with self._session.get(fusion_url(id1, id2)) as resp:
+                if resp.status == 404 or (resp.status == 200 and resp.content_type != "image/png"):
+                    self._mark_bad(id1, id2)
+                    return None
+                if resp.status != 200:
+                    return None  # 一時的な失敗は記録しない
+                data = await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+        path = self.path_for(id1, id2)
+        try:
+            await asyncio.to_thread(_write_file, path, data)
+        except OSError:
+            log.exception("failed to write %s", path)
+            return None
+        self._files[name] = len(data)
+        self._total += len(data)
+        self._evict()
+        return path
+
+    def _mark_bad(self, id1: int, id2: int):
+        self.bad.add((id1, id2))
+        with open(self._bad_path, "a", encoding="utf-8") as f:
+            f.write(f"{id1}.{id2}\n")
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def _write_file(path: str, data: bytes):
+    # 一時ファイル名は書き込みごとに変え、別プロセスなどと同じ画像を書いても衝突しないようにする
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class QuestionPrefetcher:
+    """
+    ゲームごとの先読みキュー。出題中に次の depth 問分の組み合わせを選び、
+    画像をキャッシュへ取得しておく。壊れた組み合わせはここで読み飛ばす。
+    使える組み合わせが見つからなくなったら先読みをやめ、next() は NoQuestionError を送出する。
+    """
+
+    def __init__(self, cache: ImageCache, draw, depth: int = 3):
+        self.cache = cache
+        self.draw = draw  # () -> (id1, id2)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self._task: asyncio.Task | None = None
+        self.exhausted = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = tracing.spawn(self._fill())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _draw_usable(self) -> tuple[int, int]:
+        for _ in range(MAX_BAD_DRAWS):
+            pair = self.draw()
+            if pair not in self.cache.bad:
+                return pair
+        raise NoQuestionError
+
+    async def _fill(self):
+        bad_fetches = 0
+        try:
+            while True:
+                pair = self._draw_usable()
+                try:
+                    path = await self.cache.fetch(*pair)
+                except Exception:
+                    # 想定外の失敗で先読みタスクを終わらせない（一時的な失敗と同じく待って引き直す）
+                    log.exception("prefetch of %s failed", pair)
+                    path = None
+                if path is None:
+                    bad_fetches = bad_fetches + 1 if pair in self.cache.bad else 0
+                    if bad_fetches >= MAX_BAD_DRAWS:
+                        raise NoQuestionError
+                    await asyncio.sleep(1)  # ホスト障害時に空回りしない
+                    continue
+                bad_fetches = 0
+                await self._queue.put((pair, path))
+        except NoQuestionError:
+            self.exhausted = True
+
+    async def next(self, timeout: float = 3.0) -> tuple[tuple[int, int], str | None]:
+        """
+        次の問題 (組み合わせ, 画像パス)。先読みが間に合わなければパスは None。
+        停止済みのプリフェッチャーは再開しない（終了したゲームにタスクを残さない）。
+        """
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if self._task is not None and not self._task.done():
+            try:
+                return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._draw_usable(), None
@@ -0,0 +1,56 @@
+# guild_config.py
+
+
+class GuildConfig:
+    """サーバーごとの設定（管理ロール・VCカテゴリー・クイズ設定）"""
+
+    def __init__(
+        self,
+        admin_role_id: int | None = None,
+        vc_category_id: int | None = None,
+        win_score: int = 10,
+        season: int = 1,
+    ):
+        self.admin_role_id = admin_role_id
+        self.vc_category_id = vc_category_id
+        self.win_score = win_score  # この点数に達したら優勝
+        self.season = season  # 通算ランキングのシーズン番号
+
+    def to_dict(self) -> dict:
+        return {
+            "admin_role_id": self.admin_role_id,
+            "vc_category_id": self.vc_category_id,
+            "win_score": self.win_score,
+            "season": self.season,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GuildConfig":
+        return cls(**data)
+
+
+class GuildConfigCache:
+    """
+    GuildConfig をローカルストア（kv テーブル）から読み、メモリにキャッシュする。
+    未設定のサーバーは defaults(guild_id) の値を使う。
+    """
+
+    def __init__(self, store, defaults):
+        self.store = store
+        self.defaults = defaults  # (guild_id) -> GuildConfig
+        self._cache: dict[int, GuildConfig] = {}
+
+    def get(self, guild_id: int) -> GuildConfig:
+        config = self._cache.get(guild_id)
+        if config is None:
+            data = self.store.get_value(f"guild_config:{guild_id}")
+            config = GuildConfig.from_dict(data) if data is not None else self.defaults(guild_id)
+            self._cache[guild_id] = config
+        return config
+
+    def update(self, guild_id: int, **changes) -> GuildConfig:
+        config = self.get(guild_id)
+        for key, value in changes.items():
+            setattr(config, key, value)
+        self.store.set_value(f"guild_config:{guild_id}", config.to_dict())
+        return config
@@ -1,15 +1,41 @@
 # keep_alive.py
-from flask import Flask
-from threading import Thread
+import math
 
-app = Flask(__name__)
+from aiohttp import web
 
-@app.route("/")
-def home():
-    return "Bot is running!", 200
+import metrics
 
-def run():
-    app.run(host="0.0.0.0", port=8080)
+# ゲートウェイのハートビート遅延がこれを超えたら不健康とみなす（秒）
+HEALTH_MAX_LATENCY = 10.0
 
-def keep_alive():
-    Thread(target=run).start()
+
+def create_app(bot) -> web.Application:
+    async def home(request):
+        return web.Response(text="Bot is running!")
+
+    async def health(request):
+        latency = bot.latency
+        ready = bot.is_ready()
+        healthy = ready and math.isfinite(latency) and latency < HEALTH_MAX_LATENCY
+        body = {"ready": ready, "latency": latency if math.isfinite(latency) else None}
+        return web.json_response(body, status=200 if healthy else 503)
+
+    async def metrics_endpoint(request):
+        return web.Response(
+            body=metrics.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/healthz", health)
+    app.router.add_get("/metrics", metrics_endpoint)
+    return app
+
+
+async def keep_alive(bot, host: str = "0.0.0.0", port: int = 8080) -> web.AppRunner:
+    """Botと同じイベントループ上でHTTPサーバーを起動（別スレッド不要）"""
+    runner = web.AppRunner(create_app(bot), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,163 @@
+# leaderboard.py
+import asyncio
+from bisect import bisect_left, bisect_right, insort
+
+# 1バケットの目安件数（これの2倍を超えたら分割）
+_LOAD = 256
+
+
+class RankedBoard:
+    """
+    ポイント順に並んだランキング。(-points, user_id) をキーにした分割ソート済みリストで、
+    点数の更新は該当バケットだけの挿入・削除、順位・上位K件の取得は二分探索＋バケット長の累積和で済む。
+    累積和はバケット単位の Fenwick 木で持ち、バケットの分割・削除の時だけ作り直す。
+    数万人規模でも全体の並べ替えは発生しない。
+    """
+
+    def __init__(self, scores: dict[int, int] | None = None):
+        self._points: dict[int, int] = {}
+        self._buckets: list[list[tuple[int, int]]] = []
+        self._maxes: list[tuple[int, int]] = []  # 各バケットの末尾キー
+        self._index: list[int] = [0]  # バケット長の Fenwick 木（1始まり）
+        if scores:
+            keys = sorted((-p, uid) for uid, p in scores.items())
+            self._points = dict(scores)
+            self._buckets = [keys[i:i + _LOAD] for i in range(0, len(keys), _LOAD)]
+            self._maxes = [b[-1] for b in self._buckets]
+            self._rebuild_index()
+
+    def __len__(self):
+        return len(self._points)
+
+    def points(self, user_id: int) -> int | None:
+        return self._points.get(user_id)
+
+    def set(self, user_id: int, points: int):
+        old = self._points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            self._remove((-old, user_id))
+        self._points[user_id] = points
+        self._insert((-points, user_id))
+
+    def add(self, user_id: int, delta: int = 1) -> int:
+        points = self._points.get(user_id, 0) + delta
+        self.set(user_id, points)
+        return points
+
+    def rank(self, user_id: int) -> int | None:
+        """1始まりの順位（同点はユーザーID順）。未登録なら None"""
+        points = self._points.get(user_id)
+        if points is None:
+            return None
+        key = (-points, user_id)
+        b = bisect_left(self._maxes, key)
+        return self._count_before(b) + bisect_left(self._buckets[b], key) + 1
+
+    def top(self, k: int, offset: int = 0) -> list[tuple[int, int]]:
+        """offset 件目から k 件の (user_id, points)"""
+        result = []
+        b, offset = self._locate(offset)
+        for bucket in self._buckets[b:]:
+            for neg, uid in bucket[offset:offset + k - len(result)]:
+                result.append((uid, -neg))
+            offset = 0
+            if len(result) >= k:
+                break
+        return result
+
+    def _insert(self, key):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._rebuild_index()
+            return
+        b = min(bisect_right(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[b]
+        insort(bucket, key)
+        self._maxes[b] = bucket[-1]
+        if len(bucket) > 2 * _LOAD:
+            self._buckets[b:b + 1] = [bucket[:_LOAD], bucket[_LOAD:]]
+            self._maxes[b:b + 1] = [bucket[_LOAD - 1], bucket[-1]]
+            self._rebuild_index()
+        else:
+            self._update_index(b, 1)
+
+    def _remove(self, key):
+        b = bisect_left(self._maxes, key)
+        bucket = self._buckets[b]
+        del bucket[bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[b] = bucket[-1]
+            self._update_index(b, -1)
+        else:
+            del self._buckets[b]
+            del self._maxes[b]
+            self._rebuild_index()
+
+    # ---------- バケット長の累積和（Fenwick 木） ----------
+    def _rebuild_index(self):
+        index = [0] + [len(bucket) for bucket in self._buckets]
+        for i in range(1, len(index)):
+            parent = i + (i & -i)
+            if parent < len(index):
+                index[parent] += index[i]
+        self._index = index
+
+    def _update_index(self, b: int, delta: int):
+        i = b + 1
+        while i < len(self._index):
+            self._index[i] += delta
+            i += i & -i
+
+    def _count_before(self, b: int) -> int:
+        """先頭 b 個のバケットの合計件数"""
+        total = 0
+        while b:
+            total += self._index[b]
+            b -= b & -b
+        return total
+
+    def _locate(self, pos: int) -> tuple[int, int]:
+        """pos 件目（0始まり）を含むバケット番号とバケット内の位置（範囲外ならバケット数を返す）"""
+        b = 0
+        step = 1 << (len(self._index) - 1).bit_length()
+        while step:
+            nxt = b + step
+            if nxt < len(self._index) and self._index[nxt] <= pos:
+                b = nxt
+                pos -= self._index[nxt]
+            step >>= 1
+        return b, pos
+
+
+class SeasonLeaderboard:
+    """
+    サーバー・シーズンごとの通算ランキング。初回参照時にストアから読み込み、以降はメモリ上で更新する。
+    読み込みの SQL は別スレッドで実行し、同じランキングを同時に参照した場合も読み込みは1回だけ。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._boards: dict[tuple[int, int], RankedBoard] = {}
+        self._loading: dict[tuple[int, int], asyncio.Lock] = {}
+
+    async def board(self, guild_id: int, season: int) -> RankedBoard:
+        key = (guild_id, season)
+        board = self._boards.get(key)
+        if board is not None:
+            return board
+        lock = self._loading.setdefault(key, asyncio.Lock())
+        async with lock:
+            board = self._boards.get(key)
+            if board is None:
+                scores = await asyncio.to_thread(self.store.load_scores, guild_id, season)
+                board = self._boards[key] = RankedBoard(scores)
+                del self._loading[key]
+        return board
+
+    async def add(self, guild_id: int, season: int, user_id: int, delta: int = 1) -> int:
+        points = (await self.board(guild_id, season)).add(user_id, delta)
+        self.store.put_score(guild_id, season, user_id, points)
+        return points
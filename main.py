@@ -1,10 +1,24 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
-import random
 import json
 import os
-from keep_alive import keep_alive  # Flaskサーバーを別ファイルから読み込み
+import hashlib
+from keep_alive import keep_alive  # ヘルスチェック／メトリクス用HTTPサーバー
+import metrics
+import tracing
+from answer_index import NameIndex
+from member_names import lookup_display_names, needs_fetch, remember, resolve_display_names
+from vc_batch import CATEGORY_LIMIT, VCBatch, parse_rows
+from message_purge import MultiChannelPurge, PurgeJob, scope_key
+from expiry_scheduler import ExpiryScheduler
+from state_store import StateStore
+from fusion_images import ImageCache, NoQuestionError, QuestionPrefetcher, fusion_url
+from channel_actor import ChannelActor
+from outbound import ChannelOutbox, QUESTION
+from guild_config import GuildConfig, GuildConfigCache
+from quiz_deck import QuestionDeck
+from leaderboard import RankedBoard, SeasonLeaderboard
 import asyncio
 from datetime import datetime, timedelta, timezone
 
@@ -13,12 +27,28 @@ ENTRY_FEE = 1000
 CURRENCY_UNIT = "spt"
 PAY_COMMAND_PREFIX = "/pay"  # VirtualCryptoのコマンド
 
-# Guild 固定
+# Guild 固定（単一サーバーモード）
 GUILD_ID = 1398607685158440991
 
 # 管理ロール（このロールだけが一部コマンド実行可）
 ADMIN_ROLE_ID = 1398724601256874014
 
+# プライベートVCを作成する固定カテゴリー
+PRIVATE_VC_CATEGORY_ID = 1399413936322777179
+
+# 複数サーバーモード（MULTI_GUILD=1）：自動シャーディング＋グローバルコマンド＋サーバーごとの設定
+MULTI_GUILD = os.environ.get("MULTI_GUILD") == "1"
+# コマンドの登録先（単一サーバーモードは GUILD_ID のみ、複数サーバーモードはグローバル）
+COMMAND_SCOPE = {} if MULTI_GUILD else {"guild": discord.Object(id=GUILD_ID)}
+SYNC_GUILD = None if MULTI_GUILD else discord.Object(id=GUILD_ID)
+
+# 大規模サーバー向けの省メモリモード（LEAN_MEMBER_CACHE=1）：
+# 起動時に全メンバーを取得せず、メンバーキャッシュはVC接続中の人だけにする（名前は必要な分だけ取得）
+LEAN_MEMBER_CACHE = os.environ.get("LEAN_MEMBER_CACHE") == "1"
+
+# /delete_range の進捗表示を更新する間隔（秒）
+PROGRESS_INTERVAL = 5
+
 # タイムゾーン（JST）
 JST = timezone(timedelta(hours=9), name="Asia/Tokyo")
 
@@ -26,31 +56,139 @@ JST = timezone(timedelta(hours=9), name="Asia/Tokyo")
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot_class = commands.AutoShardedBot if MULTI_GUILD else commands.Bot
+bot = bot_class(
+    command_prefix="!",
+    intents=intents,
+    chunk_guilds_at_startup=not LEAN_MEMBER_CACHE,
+    # VC のオーナー判定・ユーザー追加に voice は必要。joined（全メンバー保持）は省メモリモードでは切る
+    member_cache_flags=(
+        discord.MemberCacheFlags(voice=True, joined=False) if LEAN_MEMBER_CACHE
+        else discord.MemberCacheFlags.from_intents(intents)
+    ),
+    allowed_contexts=app_commands.AppCommandContext(guild=True),  # サーバー内専用
+)
 
 # ========= メモリ管理（クイズ／VCスケジュール） =========
-games = {}
+# { guild_id: { channel_id: GameState } }
+games: dict[int, dict[int, "GameState"]] = {}
+# チャンネルごとの回答処理アクター { channel_id: ChannelActor }
+QUIZ_ACTORS: dict[int, ChannelActor] = {}
+# チャンネルごとの送信キュー（近い時刻の送信を1通にまとめる） { channel_id: ChannelOutbox }
+OUTBOXES: dict[int, ChannelOutbox] = {}
 with open("pokedex.json", "r", encoding="utf-8") as f:
     POKEDEX = {int(k): v for k, v in json.load(f).items()}
+# 回答判定用の名前インデックス（起動時に1回だけ構築）
+NAME_INDEX = NameIndex(POKEDEX)
+# フュージョン画像のディスクキャッシュ
+IMAGE_CACHE = ImageCache(os.environ.get("IMAGE_CACHE_DIR", "image_cache"))
 
 class GameState:
-    def __init__(self, owner_id):
+    def __init__(self, owner_id, deck: QuestionDeck | None = None):
         self.owner_id = owner_id
+        self.deck = deck or QuestionDeck()  # 出題する組み合わせの山札
         self.participants = set()
-        self.scores = {}
+        self.board = RankedBoard()  # このゲームの得点順ランキング
         self.active = False
         self.current_answer = None
+        self.question_seq = 0  # 問題が締め切られるたびに進む番号（正解の早い者勝ち判定用）
+        self.prefetcher = None  # 次の問題の先読み（保存対象外）
+
+    def to_dict(self) -> dict:
+        return {
+            "owner_id": self.owner_id,
+            "participants": list(self.participants),
+            "scores": [[uid, score] for uid, score in self.board.top(len(self.board))],
+            "active": self.active,
+            "current_answer": list(self.current_answer) if self.current_answer else None,
+            "deck": self.deck.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameState":
+        deck = QuestionDeck.from_dict(data["deck"]) if "deck" in data else None
+        game = cls(owner_id=data["owner_id"], deck=deck)
+        game.participants = set(data["participants"])
+        game.board = RankedBoard({uid: score for uid, score in data["scores"]})
+        game.active = data["active"]
+        game.current_answer = tuple(data["current_answer"]) if data["current_answer"] else None
+        return game
 
 # 作成したプライベートVCの情報を保持
-# { channel_id: {"owner_id": int, "start": datetime, "end": datetime} }
-PRIVATE_VC: dict[int, dict] = {}
+# { guild_id: { channel_id: {"owner_id": int, "start": datetime, "end": datetime} } }
+PRIVATE_VC: dict[int, dict[int, dict]] = {}
+
+# 再起動・クラッシュをまたいで games / PRIVATE_VC を保持するローカルストア
+STORE = StateStore(os.environ.get("BOT_STATE_DB", "bot_state.db"))
+
+def default_guild_config(guild_id: int) -> GuildConfig:
+    if guild_id == GUILD_ID:
+        return GuildConfig(admin_role_id=ADMIN_ROLE_ID, vc_category_id=PRIVATE_VC_CATEGORY_ID)
+    return GuildConfig()
+
+# サーバーごとの設定（ストアから読み込んでメモリにキャッシュ）
+GUILD_CONFIGS = GuildConfigCache(STORE, default_guild_config)
+# ゲームをまたいだシーズンごとの通算ランキング
+LEADERBOARD = SeasonLeaderboard(STORE)
+
+def get_game(guild_id: int, channel_id: int) -> GameState | None:
+    return games.get(guild_id, {}).get(channel_id)
+
+def get_outbox(channel) -> ChannelOutbox:
+    outbox = OUTBOXES.get(channel.id)
+    if outbox is None:
+        outbox = OUTBOXES[channel.id] = ChannelOutbox(channel)
+    return outbox
+
+def guild_vcs(guild_id: int) -> dict[int, dict]:
+    return PRIVATE_VC.setdefault(guild_id, {})
+
+def save_game(guild_id: int, channel_id: int):
+    """games の変更をストアへ反映（書き込みはバックグラウンドでまとめて行われる）"""
+    game = get_game(guild_id, channel_id)
+    if game is not None:  # 待ち合わせ中に終了したゲームは書き戻さない
+        STORE.put_game(channel_id, game.to_dict())
+
+async def run_step(func, *args):
+    # アクターのタスクは on_message のトレースを引き継がないので、1手ずつ別に計測する
+    await tracing.run_traced(f"actor:{func.__name__}", func, *args)
+
+def quiz_actor(channel_id: int) -> ChannelActor:
+    """
+    チャンネルのクイズ進行を直列に処理するアクター。
+    正解処理・開始・スキップ・中断はすべてここを通し、出題の待ち合わせ中に状態が入れ替わらないようにする。
+    """
+    actor = QUIZ_ACTORS.get(channel_id)
+    if actor is None:
+        actor = QUIZ_ACTORS[channel_id] = ChannelActor(run_step)
+    return actor
+
+def end_game(guild_id: int, channel_id: int):
+    game = games.get(guild_id, {}).pop(channel_id, None)
+    if game is not None and game.prefetcher is not None:
+        game.prefetcher.stop()
+    actor = QUIZ_ACTORS.pop(channel_id, None)
+    if actor is not None:
+        actor.close()
+    outbox = OUTBOXES.pop(channel_id, None)
+    if outbox is not None:
+        outbox.close()
+    STORE.delete_game(channel_id)
 
 # ========= 共通ユーティリティ =========
+def is_admin(member) -> bool:
+    """サーバーの管理ロールを持つか（ロール未設定のサーバーは『サーバー管理』権限で代用）"""
+    if not isinstance(member, discord.Member):
+        return False
+    role_id = GUILD_CONFIGS.get(member.guild.id).admin_role_id
+    if role_id is None:
+        return member.guild_permissions.manage_guild
+    return any(r.id == role_id for r in member.roles)
+
 def requires_admin_role():
     """指定ロール必須のチェックデコレータ"""
     def predicate(interaction: discord.Interaction) -> bool:
-        member = interaction.user
-        return isinstance(member, discord.Member) and any(r.id == ADMIN_ROLE_ID for r in member.roles)
+        return is_admin(interaction.user)
     return app_commands.check(predicate)
 
 @bot.tree.error
@@ -80,6 +218,15 @@ def parse_period_str(period: str) -> tuple[datetime, datetime]:
         raise ValueError("終了は開始より後の日時を指定してください。")
     return start, end
 
+def join_report(lines: list[str], limit: int = 1900) -> str:
+    """集計の各行を1通にまとめる（メッセージの文字数上限に収まらない行はまとめて省略）"""
+    report = ""
+    for i, line in enumerate(lines):
+        if len(report) + len(line) > limit:
+            return report + f"…ほか {len(lines) - i} 行"
+        report += line + "\n"
+    return report.rstrip()
+
 def parse_point_str(point: str) -> datetime:
     """
     'YYYY-MM-DD-HH:MM' をJSTでdatetimeに。
@@ -96,26 +243,66 @@ class JoinView(discord.ui.View):
 
     @discord.ui.button(label="参加します", style=discord.ButtonStyle.success, custom_id="join_quiz_button")
     async def join(self, interaction: discord.Interaction, button: discord.ui.Button):
-        game = games.get(self.channel_id)
+        # 再起動後に再登録された永続Viewは channel_id を持たないので実行チャンネルから引く
+        channel_id = self.channel_id or interaction.channel_id
+        game = get_game(interaction.guild_id, channel_id)
         if not game or game.active:
             await interaction.response.send_message("参加は締め切られました。", ephemeral=True)
             return
         game.participants.add(interaction.user.id)
+        remember(interaction.user)
+        save_game(interaction.guild_id, channel_id)
         await interaction.response.send_message(f"{interaction.user.display_name} が参加しました！", ephemeral=True)
 
 # ========= クイズ系コマンド =========
-@bot.tree.command(name="quiz_start", guild=discord.Object(id=GUILD_ID))
-async def quiz_start(interaction: discord.Interaction):
-    if interaction.channel_id in games:
+@bot.tree.command(name="quiz_start", **COMMAND_SCOPE)
+@app_commands.describe(
+    difficulty="出題するポケモンの難易度",
+    id_min="出題する図鑑番号の下限",
+    id_max="出題する図鑑番号の上限",
+    self_fusion="同じポケモン同士のフュージョンも出題する",
+    seed="出題順のシード（同じ値で同じ順番を再現）",
+)
+@app_commands.choices(difficulty=[
+    app_commands.Choice(name="かんたん", value="easy"),
+    app_commands.Choice(name="ふつう", value="normal"),
+    app_commands.Choice(name="むずかしい", value="hard"),
+])
+async def quiz_start(
+    interaction: discord.Interaction,
+    difficulty: app_commands.Choice[str] | None = None,
+    id_min: app_commands.Range[int, 1, 151] = 1,
+    id_max: app_commands.Range[int, 1, 151] = 151,
+    self_fusion: bool = False,
+    seed: int | None = None,
+):
+    if get_game(interaction.guild_id, interaction.channel_id):
         await interaction.response.send_message("このチャンネルではすでにクイズが開催されています。", ephemeral=True)
         return
-    games[interaction.channel_id] = GameState(owner_id=interaction.user.id)
+    try:
+        deck = QuestionDeck(
+            seed,
+            id_min=id_min,
+            id_max=id_max,
+            allow_self=self_fusion,
+            tier=difficulty.value if difficulty else "normal",
+        )
+    except ValueError as e:
+        await interaction.response.send_message(f"出題条件が不正です：{e}", ephemeral=True)
+        return
+    game = GameState(owner_id=interaction.user.id, deck=deck)
+    games.setdefault(interaction.guild_id, {})[interaction.channel_id] = game
+    save_game(interaction.guild_id, interaction.channel_id)
+    # 参加受付の間に最初の問題を用意しておく
+    ensure_prefetcher(game)
     view = JoinView(channel_id=interaction.channel_id)
-    await interaction.response.send_message("ポケモンフュージョンクイズを開始します！\n参加するには以下のボタンを押してください👇", view=view)
+    await interaction.response.send_message(
+        f"ポケモンフュージョンクイズを開始します！（シード：{deck.seed}）\n参加するには以下のボタンを押してください👇", view=view
+    )
 
-@bot.tree.command(name="quiz_begin", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="quiz_begin", **COMMAND_SCOPE)
 async def quiz_begin(interaction: discord.Interaction):
-    game = games.get(interaction.channel_id)
+    game = get_game(interaction.guild_id, interaction.channel_id)
     if not game:
         await interaction.response.send_message("クイズが開始されていません。", ephemeral=True)
         return
@@ -125,103 +312,279 @@ async def quiz_begin(interaction: discord.Interaction):
     if not game.participants:
         await interaction.response.send_message("参加者がいません。", ephemeral=True)
         return
+    # 出題はチャンネルのアクターで行う（順番待ちの間に応答期限が切れないよう先に保留）
+    await interaction.response.defer(thinking=True)
+    quiz_actor(interaction.channel_id).submit(begin_quiz, interaction, game)
+
+async def begin_quiz(interaction: discord.Interaction, game):
+    """開始の案内と最初の問題を1通で送る"""
+    if get_game(interaction.guild_id, interaction.channel_id) is not game or game.active:
+        await interaction.followup.send("クイズはすでに開始されているか、終了しています。")
+        return
     game.active = True
-    await interaction.response.send_message("クイズを開始します！")
-    await send_quiz(interaction.channel, game)
+    try:
+        embed, file = await next_question(interaction.channel, game)
+    except NoQuestionError:
+        end_game(interaction.guild_id, interaction.channel_id)
+        await interaction.followup.send(NO_QUESTION_MESSAGE)
+        return
+    await interaction.followup.send("クイズを開始します！", **question_payload(embed, file))
 
-async def send_quiz(channel, game):
-    id1 = random.randint(1, 151)
-    id2 = random.randint(1, 151)
-    url = f"https://images.alexonsager.net/pokemon/fused/{id1}/{id1}.{id2}.png"
+# 山札の組み合わせがすべて画像を取得できない時の案内
+NO_QUESTION_MESSAGE = "出題できる問題（画像を取得できる組み合わせ）がないため、クイズを終了します。"
+
+def ensure_prefetcher(game):
+    """初回だけ作って先読みを開始する（end_game で止めたものは再開しない）"""
+    if game.prefetcher is None:
+        game.prefetcher = QuestionPrefetcher(IMAGE_CACHE, game.deck.draw)
+        game.prefetcher.start()
+    return game.prefetcher
+
+async def next_question(channel, game, timeout: float = 3.0) -> tuple[discord.Embed, discord.File | None]:
+    """次の問題を確定させ、送るEmbedと添付画像を返す"""
+    (id1, id2), path = await ensure_prefetcher(game).next(timeout)
     game.current_answer = (id1, id2)
+    save_game(channel.guild.id, channel.id)
     embed = discord.Embed(title="このポケモンは誰と誰のフュージョン？")
-    embed.set_image(url=url)
     embed.set_footer(text="例: フシギダネ ヒトカゲ のように日本語で回答してください")
-    await channel.send(embed=embed)
+    # 先読み済みの画像は添付で送る（間に合わなかった時だけURL参照）
+    try:
+        file = discord.File(path, filename="fusion.png") if path else None
+    except FileNotFoundError:
+        file = None  # 送信直前にキャッシュから追い出された
+    if file is not None:
+        embed.set_image(url="attachment://fusion.png")
+    else:
+        embed.set_image(url=fusion_url(id1, id2))
+    return embed, file
 
-def normalize(text):
-    return text.replace("　", " ").replace(" ", "").lower()
+def question_payload(embed, file) -> dict:
+    return {"embed": embed, "file": file} if file is not None else {"embed": embed}
+
+async def send_quiz(channel, game):
+    try:
+        embed, file = await next_question(channel, game)
+    except NoQuestionError:
+        get_outbox(channel).post(NO_QUESTION_MESSAGE)
+        await announce_winner(channel, game)
+        end_game(channel.guild.id, channel.id)
+        return
+    await get_outbox(channel).send(embed=embed, file=file, priority=QUESTION)
 
 @bot.event
 async def on_message(message):
     if message.author.bot:
         return
 
-    game = games.get(message.channel.id)
-    if game and game.active and message.author.id in game.participants:
-        name1 = POKEDEX.get(game.current_answer[0])
-        name2 = POKEDEX.get(game.current_answer[1])
-        if normalize(name1) in normalize(message.content) and normalize(name2) in normalize(message.content):
-            uid = message.author.id
-            game.scores[uid] = game.scores.get(uid, 0) + 1
-            await message.channel.send(f"🎉 {message.author.display_name} 正解！ 現在のスコア: {game.scores[uid]}")
-            if game.scores[uid] >= 10:
-                await announce_winner(message.channel, game)
-                del games[message.channel.id]
-            else:
-                game.current_answer = None
-                await send_quiz(message.channel, game)
+    # 文字列処理の前に安価な判定で弾く（ゲームなし／非参加者／出題待ち）
+    game = None
+    if message.guild is not None:  # DMにはゲームがない（コマンドは下で処理する）
+        game = get_game(message.guild.id, message.channel.id)
+    if (
+        game
+        and game.active
+        and game.current_answer is not None
+        and message.author.id in game.participants
+        and NAME_INDEX.matches(message.content, game.current_answer)
+    ):
+        # 受信時点の問題番号を添えてチャンネルのアクターへ（判定・送信はアクター側で直列に）
+        quiz_actor(message.channel.id).submit(handle_correct_answer, message, game.question_seq)
 
     # ✅ 常に最後に入れること
     await bot.process_commands(message)
 
+class RankingPager(discord.ui.View):
+    """ランキングを1ページ10人ずつ表示し、ボタンでページを送る（表示名はページ単位で解決）"""
+
+    PER_PAGE = 10
+
+    def __init__(self, guild, title, board: RankedBoard):
+        super().__init__(timeout=300)
+        self.guild = guild
+        self.title = title
+        self.board = board
+        self.page = 0
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.board) // self.PER_PAGE))
+
+    def needs_fetch(self) -> bool:
+        return needs_fetch(self.guild, [uid for uid, _ in self.board.top(self.PER_PAGE, self.page * self.PER_PAGE)])
+
+    async def render(self) -> discord.Embed:
+        self.page = min(self.page, self.page_count - 1)
+        offset = self.page * self.PER_PAGE
+        entries = self.board.top(self.PER_PAGE, offset)
+        names = await resolve_display_names(self.guild, [uid for uid, _ in entries], cache=not LEAN_MEMBER_CACHE)
+        embed = discord.Embed(
+            title=self.title,
+            description="\n".join(
+                f"{offset + i}位：{names[uid]} － {points}ポイント" for i, (uid, points) in enumerate(entries, 1)
+            ),
+        )
+        embed.set_footer(text=f"{self.page + 1}/{self.page_count}ページ・全{len(self.board)}人")
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.page_count - 1
+        return embed
+
+    async def send(self, interaction: discord.Interaction, content: str | None = None, *, ephemeral: bool = False):
+        """コマンドへの応答として1ページ目を送る（保留済みの応答にはフォローアップで送る）"""
+        if interaction.response.is_done():
+            await interaction.followup.send(content, embed=await self.render(), view=self, ephemeral=ephemeral)
+            return
+        # キャッシュで解決できない名前がある時だけ先に応答を保留（3秒制限対策）
+        if self.needs_fetch():
+            await interaction.response.defer(ephemeral=ephemeral)
+            await interaction.followup.send(content, embed=await self.render(), view=self, ephemeral=ephemeral)
+            return
+        await interaction.response.send_message(content, embed=await self.render(), view=self, ephemeral=ephemeral)
+
+    async def turn(self, interaction: discord.Interaction, step: int):
+        self.page += step
+        if self.needs_fetch():
+            await interaction.response.defer()
+            await interaction.edit_original_response(embed=await self.render(), view=self)
+            return
+        await interaction.response.edit_message(embed=await self.render(), view=self)
+
+    @discord.ui.button(label="◀ 前へ", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, -1)
+
+    @discord.ui.button(label="次へ ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, 1)
+
+async def handle_correct_answer(message, seq: int):
+    """正解を1問につき1人だけ確定させる。締め切り後に届いた正解は何も送らずに捨てる"""
+    game = get_game(message.guild.id, message.channel.id)
+    if game is None or not game.active or seq != game.question_seq:
+        return
+    game.question_seq += 1
+    game.current_answer = None
+
+    uid = message.author.id
+    remember(message.author)
+    score = game.board.add(uid)
+    save_game(message.guild.id, message.channel.id)
+    config = GUILD_CONFIGS.get(message.guild.id)
+    await LEADERBOARD.add(message.guild.id, config.season, uid)
+    # 正解の通知は待たずに予約し、続く問題／結果発表と同じ1通で送られる
+    get_outbox(message.channel).post(f"🎉 {message.author.display_name} 正解！ 現在のスコア: {score}")
+    if score >= config.win_score:
+        await announce_winner(message.channel, game)
+        end_game(message.guild.id, message.channel.id)
+    else:
+        await send_quiz(message.channel, game)
+
 async def announce_winner(channel, game):
-    sorted_scores = sorted(game.scores.items(), key=lambda x: x[1], reverse=True)
-    embed = discord.Embed(title="🏆 クイズ終了！ランキング発表 🏆")
-    for i, (uid, score) in enumerate(sorted_scores, 1):
-        member = await channel.guild.fetch_member(uid)
-        embed.add_field(name=f"{i}位：{member.display_name}", value=f"{score}ポイント", inline=False)
-    await channel.send(embed=embed)
-
-@bot.tree.command(name="quiz_ranking", guild=discord.Object(id=GUILD_ID))
+    pager = RankingPager(channel.guild, "🏆 クイズ終了！ランキング発表 🏆", game.board)
+    await get_outbox(channel).send(embed=await pager.render(), view=pager)
+
+@bot.tree.command(name="quiz_ranking", **COMMAND_SCOPE)
 async def quiz_ranking(interaction: discord.Interaction):
-    game = games.get(interaction.channel_id)
-    if not game or not game.scores:
+    game = get_game(interaction.guild_id, interaction.channel_id)
+    if not game or not len(game.board):
         await interaction.response.send_message("ランキングはまだありません。", ephemeral=True)
         return
-    sorted_scores = sorted(game.scores.items(), key=lambda x: x[1], reverse=True)
-    embed = discord.Embed(title="📊 現在のランキング")
-    for i, (uid, score) in enumerate(sorted_scores, 1):
-        member = await interaction.guild.fetch_member(uid)
-        embed.add_field(name=f"{i}位：{member.display_name}", value=f"{score}ポイント", inline=False)
-    await interaction.response.send_message(embed=embed)
+    await RankingPager(interaction.guild, "📊 現在のランキング", game.board).send(interaction)
 
-@bot.tree.command(name="quiz_stop", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="leaderboard", description="シーズンの通算ランキングを表示", **COMMAND_SCOPE)
+@app_commands.describe(season="表示するシーズン（省略時は現在のシーズン）")
+async def leaderboard(interaction: discord.Interaction, season: app_commands.Range[int, 1] | None = None):
+    season = season or GUILD_CONFIGS.get(interaction.guild_id).season
+    board = await LEADERBOARD.board(interaction.guild_id, season)
+    if not len(board):
+        await interaction.response.send_message(f"シーズン{season}の記録はまだありません。", ephemeral=True)
+        return
+    await RankingPager(interaction.guild, f"🏅 シーズン{season} 通算ランキング", board).send(interaction)
+
+@bot.tree.command(name="myrank", description="今シーズンの自分の順位を表示", **COMMAND_SCOPE)
+async def myrank(interaction: discord.Interaction):
+    season = GUILD_CONFIGS.get(interaction.guild_id).season
+    board = await LEADERBOARD.board(interaction.guild_id, season)
+    rank = board.rank(interaction.user.id)
+    if rank is None:
+        await interaction.response.send_message(f"シーズン{season}の記録はまだありません。", ephemeral=True)
+        return
+    await interaction.response.send_message(
+        f"シーズン{season}：{rank}位 / {len(board)}人（{board.points(interaction.user.id)}ポイント）",
+        ephemeral=True,
+    )
+
+@bot.tree.command(name="quiz_stop", **COMMAND_SCOPE)
 async def quiz_stop(interaction: discord.Interaction):
-    game = games.get(interaction.channel_id)
+    game = get_game(interaction.guild_id, interaction.channel_id)
     if not game:
         await interaction.response.send_message("クイズは実行されていません。", ephemeral=True)
         return
-    await interaction.response.send_message("クイズを中断します。現在のランキングはこちら：")
-    await announce_winner(interaction.channel, game)
-    del games[interaction.channel_id]
+    await interaction.response.defer(thinking=True)
+    quiz_actor(interaction.channel_id).submit(stop_quiz, interaction, game)
+
+async def stop_quiz(interaction: discord.Interaction, game):
+    if get_game(interaction.guild_id, interaction.channel_id) is not game:
+        await interaction.followup.send("クイズは実行されていません。")
+        return
+    pager = RankingPager(interaction.guild, "🏆 クイズ終了！ランキング発表 🏆", game.board)
+    await pager.send(interaction, "クイズを中断します。現在のランキングはこちら：")
+    end_game(interaction.guild_id, interaction.channel_id)
 
-@bot.tree.command(name="quiz_skip", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="quiz_skip", **COMMAND_SCOPE)
 async def quiz_skip(interaction: discord.Interaction):
-    game = games.get(interaction.channel_id)
+    game = get_game(interaction.guild_id, interaction.channel_id)
     if not game or not game.active:
         await interaction.response.send_message("クイズは現在行われていません。", ephemeral=True)
         return
     if interaction.user.id != game.owner_id:
         await interaction.response.send_message("このコマンドは主催者のみ使用できます。", ephemeral=True)
         return
+    await interaction.response.defer(thinking=True)
+    quiz_actor(interaction.channel_id).submit(skip_question, interaction, game)
+
+async def skip_question(interaction: discord.Interaction, game):
+    if get_game(interaction.guild_id, interaction.channel_id) is not game or not game.active:
+        await interaction.followup.send("クイズは現在行われていません。")
+        return
+    game.question_seq += 1
     game.current_answer = None
-    await interaction.response.send_message("問題をスキップしました。次の問題を出題します。")
-    await send_quiz(interaction.channel, game)
+    try:
+        embed, file = await next_question(interaction.channel, game)
+    except NoQuestionError:
+        pager = RankingPager(interaction.guild, "🏆 クイズ終了！ランキング発表 🏆", game.board)
+        await pager.send(interaction, NO_QUESTION_MESSAGE)
+        end_game(interaction.guild_id, interaction.channel_id)
+        return
+    await interaction.followup.send("問題をスキップしました。次の問題はこちら：", **question_payload(embed, file))
 
 # ========= 追加：運営コマンド（ロール制限対象） =========
 
-@bot.tree.command(name="delete_range", description="指定期間（YYYY-MM-DD-HH:MM～YYYY-MM-DD-HH:MM）のメッセージを削除", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="delete_range", description="指定期間（YYYY-MM-DD-HH:MM～YYYY-MM-DD-HH:MM）のメッセージを削除", **COMMAND_SCOPE)
 @requires_admin_role()
-@app_commands.describe(period="例: 2025-08-08-21:00～2025-08-08-22:30")
-async def delete_range(interaction: discord.Interaction, period: str):
-    """コマンド実行チャンネルの期間内メッセージを削除"""
+@app_commands.describe(
+    period="例: 2025-08-08-21:00～2025-08-08-22:30",
+    category="指定するとカテゴリー内の全テキストチャンネルが対象",
+    all_channels="True にするとサーバー内の全テキストチャンネルが対象",
+)
+async def delete_range(
+    interaction: discord.Interaction,
+    period: str,
+    category: discord.CategoryChannel | None = None,
+    all_channels: bool = False,
+):
+    """期間内メッセージを削除（既定はコマンド実行チャンネル）"""
+    if category is not None or all_channels:
+        await delete_range_multi(interaction, period, category)
+        return
     channel: discord.TextChannel = interaction.channel  # 実行チャンネル対象
     # 権限チェック
     me = interaction.guild.me
     if not channel.permissions_for(me).manage_messages:
         await interaction.response.send_message("Botに『メッセージの管理』権限が必要です。", ephemeral=True)
         return
+    if not channel.permissions_for(me).read_message_history:
+        await interaction.response.send_message("Botに『メッセージ履歴を読む』権限が必要です。", ephemeral=True)
+        return
     if not channel.permissions_for(interaction.user).manage_messages:
         await interaction.response.send_message("あなたに『メッセージの管理』権限が必要です。", ephemeral=True)
         return
@@ -234,47 +597,130 @@ async def delete_range(interaction: discord.Interaction, period: str):
 
     await interaction.response.send_message(f"🧹 削除を開始します…（{start.strftime('%Y-%m-%d %H:%M')} ～ {end.strftime('%Y-%m-%d %H:%M')} JST）", ephemeral=True)
 
-    # Discordの一括削除は14日以内のみ。範囲を2つに分割して処理。
-    now = datetime.now(JST)
-    bulk_limit_dt = now - timedelta(days=14)
-
-    deleted = 0
-
-    async def delete_iter(before: datetime, after: datetime):
-        nonlocal deleted
-        async for msg in channel.history(limit=None, before=before, after=after, oldest_first=True):
-            try:
-                await msg.delete()
-                deleted += 1
-                # 速すぎ対策で少し待つ（レート制限よけ）
-                await asyncio.sleep(0.1)
-            except Exception:
-                # 削除不能メッセージなどは無視
-                await asyncio.sleep(0.05)
-
-    # ① 直近14日以内の部分
-    part1_after = max(start, bulk_limit_dt)
-    if end > bulk_limit_dt:
+    # 進捗は開始メッセージを定期的に書き換えて表示（編集しすぎないよう間引く）
+    last_report = 0.0
+
+    async def report_progress(job: PurgeJob):
+        nonlocal last_report
+        now = asyncio.get_running_loop().time()
+        if now - last_report < PROGRESS_INTERVAL:
+            return
+        last_report = now
         try:
-            purged = await channel.purge(limit=None, after=part1_after, before=end, bulk=True)
-            deleted += len(purged)
-        except Exception:
-            # 失敗時は1件ずつ
-            await delete_iter(before=end, after=part1_after)
+            await interaction.edit_original_response(content=f"🧹 削除中…：{job.deleted} 件")
+        except discord.HTTPException:
+            pass  # トークン失効（15分）後は進捗表示のみ諦める
 
-    # ② 14日より前の部分は個別削除
-    if start < bulk_limit_dt:
-        await delete_iter(before=min(end, bulk_limit_dt), after=start)
+    job = PurgeJob(channel, after=start, before=end, store=STORE, on_progress=report_progress)
+    try:
+        await job.run()
+    except discord.HTTPException as e:
+        # 履歴の取得が権限不足などで失敗した（削除済みの位置までは保存されている）
+        error = f"{e.status} {e.text}".strip()
+        summary = (
+            f"⚠️ 削除を中断しました（{error}）：{job.deleted} 件削除済み\n"
+            "同じ条件で再実行すると、中断した位置から再開します。"
+        )
+    else:
+        summary = f"✅ 削除完了：{job.deleted} 件"
+        if job.failed:
+            summary += f"（削除できなかったもの：{job.failed} 件）"
+        if job.resumed:
+            summary += "\n前回中断した位置から再開しました。"
+    try:
+        await interaction.followup.send(summary, ephemeral=True)
+    except discord.HTTPException:
+        pass
 
+async def delete_range_multi(interaction: discord.Interaction, period: str, category: discord.CategoryChannel | None):
+    """カテゴリー内／サーバー全体のテキストチャンネルを並行して削除し、チャンネル別の集計を返す"""
     try:
-        await interaction.followup.send(f"✅ 削除完了：{deleted} 件", ephemeral=True)
-    except discord.InteractionResponded:
+        start, end = parse_period_str(period)
+    except Exception as e:
+        await interaction.response.send_message(f"日時の解釈に失敗しました：{e}", ephemeral=True)
+        return
+
+    # Bot と実行者の両方が『メッセージの管理』を持つチャンネルだけを対象にする
+    me = interaction.guild.me
+    candidates = category.text_channels if category is not None else interaction.guild.text_channels
+    channels = [
+        ch for ch in candidates
+        if ch.permissions_for(me).manage_messages
+        and ch.permissions_for(me).read_message_history
+        and ch.permissions_for(interaction.user).manage_messages
+    ]
+    if not channels:
+        await interaction.response.send_message("対象にできるチャンネルがありません（Botとあなたの両方に『メッセージの管理』権限が必要です）。", ephemeral=True)
+        return
+
+    scope = f"カテゴリー「{category.name}」" if category is not None else "サーバー全体"
+    await interaction.response.send_message(
+        f"🧹 {scope}の {len(channels)} チャンネルで削除を開始します…"
+        f"（{start.strftime('%Y-%m-%d %H:%M')} ～ {end.strftime('%Y-%m-%d %H:%M')} JST）",
+        ephemeral=True,
+    )
+
+    last_report = 0.0
+
+    async def report_progress(purge: MultiChannelPurge):
+        nonlocal last_report
+        now = asyncio.get_running_loop().time()
+        if now - last_report < PROGRESS_INTERVAL:
+            return
+        last_report = now
+        try:
+            await interaction.edit_original_response(
+                content=f"🧹 削除中…：{purge.deleted} 件（{purge.finished}/{len(channels) - len(purge.skipped)} チャンネル完了）"
+            )
+        except discord.HTTPException:
+            pass
+
+    key = scope_key(category.id if category is not None else interaction.guild_id, start, end)
+    purge = MultiChannelPurge(channels, after=start, before=end, store=STORE, key=key, on_progress=report_progress)
+    await purge.run()
+
+    lines = [
+        f"✅ 削除完了：{purge.deleted} 件／{len(purge.jobs)} チャンネル"
+        f"（{purge.elapsed:.1f}秒・{purge.deleted / max(purge.elapsed, 0.001):.0f} 件/秒）"
+    ]
+    if purge.failed:
+        lines.append(f"削除できなかったもの：{purge.failed} 件")
+    if purge.skipped:
+        lines.append(f"前回完了済みのため省略：{len(purge.skipped)} チャンネル")
+    jobs = sorted(purge.jobs.values(), key=lambda job: job.deleted, reverse=True)
+    for job in jobs:
+        if not job.deleted and not job.failed:
+            continue
+        line = f"・{job.channel.mention}：{job.deleted} 件（{job.elapsed:.1f}秒）"
+        if job.failed:
+            line += f" 失敗 {job.failed} 件"
+        if job.resumed:
+            line += " ※途中から再開"
+        lines.append(line)
+    for channel_id, error in purge.errors.items():
+        lines.append(f"⚠️ <#{channel_id}>：中断（{error}）")
+    if purge.errors:
+        lines.append("同じ条件で再実行すると、未完了のチャンネルの続きから再開します。")
+    try:
+        await interaction.followup.send(join_report(lines), ephemeral=True)
+    except discord.HTTPException:
         pass
 
+# プライベートVCの権限テンプレート（全VCで同じオブジェクトを使い回す）
+VC_EVERYONE_DENY = discord.PermissionOverwrite(view_channel=False, connect=False)
+VC_BOT_ALLOW = discord.PermissionOverwrite(view_channel=True, connect=True, manage_channels=True)
+VC_MEMBER_ALLOW = discord.PermissionOverwrite(view_channel=True, connect=True)
+
+def private_vc_overwrites(guild, *members) -> dict:
+    overwrites = {guild.default_role: VC_EVERYONE_DENY, guild.me: VC_BOT_ALLOW}
+    for member in members:
+        overwrites[member] = VC_MEMBER_ALLOW
+    return overwrites
+
 @bot.tree.command(
     name="create_private_vc",
     description="期間付きプライベートVCを作成",
-    guild=discord.Object(id=GUILD_ID)
+    **COMMAND_SCOPE
 )
 @requires_admin_role()
 @app_commands.describe(
@@ -290,7 +736,6 @@ async def create_private_vc(interaction: discord.Interaction, target_user: disco
         return
 
     guild = interaction.guild
-    me = guild.me
 
     # 権限前提チェック
     if not guild.me.guild_permissions.manage_channels:
@@ -301,16 +746,10 @@ async def create_private_vc(interaction: discord.Interaction, target_user: disco
     vc_name = f"private-{target_user.display_name}"
 
     # 権限オーバーライト
-    overwrites = {
-        guild.default_role: discord.PermissionOverwrite(view_channel=False, connect=False),
-        me: discord.PermissionOverwrite(view_channel=True, connect=True, manage_channels=True),
-        interaction.user: discord.PermissionOverwrite(view_channel=True, connect=True),
-        target_user: discord.PermissionOverwrite(view_channel=True, connect=True),
-    }
+    overwrites = private_vc_overwrites(guild, interaction.user, target_user)
 
-    # 固定カテゴリーID（置き換えて使用）
-    PRIVATE_VC_CATEGORY_ID = 1399413936322777179  # ← 実際のカテゴリーIDに変更
-    category = discord.utils.get(guild.categories, id=PRIVATE_VC_CATEGORY_ID)
+    # サーバーごとに設定されたカテゴリー（単一サーバーモードは固定カテゴリー）
+    category = discord.utils.get(guild.categories, id=GUILD_CONFIGS.get(guild.id).vc_category_id)
 
     if category is None:
         await interaction.response.send_message("指定されたカテゴリーが見つかりません。", ephemeral=True)
@@ -324,7 +763,9 @@ async def create_private_vc(interaction: discord.Interaction, target_user: disco
         reason="期間付きプライベートVC"
     )
 
-    PRIVATE_VC[vc.id] = {"owner_id": interaction.user.id, "start": start, "end": end}
+    guild_vcs(guild.id)[vc.id] = {"owner_id": interaction.user.id, "start": start, "end": end}
+    STORE.put_vc(vc.id, guild_vcs(guild.id)[vc.id])
+    VC_SCHEDULER.schedule((guild.id, vc.id), end)
 
     msg = (
         f"✅ プライベートVCを作成しました：{vc.mention}\n"
@@ -333,7 +774,73 @@ async def create_private_vc(interaction: discord.Interaction, target_user: disco
     )
     await interaction.response.send_message(msg, ephemeral=True)
 
-@bot.tree.command(name="update_vc_time", description="プライベートVCの期間を上書き", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(
+    name="create_private_vc_batch",
+    description="CSV（user_id,期間）の行ごとに期間付きプライベートVCをまとめて作成",
+    **COMMAND_SCOPE
+)
+@requires_admin_role()
+@app_commands.describe(file="1行に「user_id,2025-08-08-21:00～2025-08-09-00:00」を並べたCSV")
+async def create_private_vc_batch(interaction: discord.Interaction, file: discord.Attachment):
+    """CSV の各行について create_private_vc と同じVCを作り、最後に1通で結果を返す"""
+    guild = interaction.guild
+    if not guild.me.guild_permissions.manage_channels:
+        await interaction.response.send_message("Botに『チャンネルの管理』権限が必要です。", ephemeral=True)
+        return
+    category = discord.utils.get(guild.categories, id=GUILD_CONFIGS.get(guild.id).vc_category_id)
+    if category is None:
+        await interaction.response.send_message("指定されたカテゴリーが見つかりません。", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except (discord.HTTPException, UnicodeDecodeError) as e:
+        await interaction.followup.send(f"CSVを読み込めませんでした：{e}", ephemeral=True)
+        return
+    rooms, errors = parse_rows(text, parse_period_str)
+
+    # VC名に使う表示名をまとめて解決（解決できなかった人はサーバーにいないとみなす）
+    names, missing = await lookup_display_names(guild, {room.user_id for room in rooms}, cache=not LEAN_MEMBER_CACHE)
+    valid = []
+    for room in rooms:
+        if room.user_id in missing:
+            errors.append(f"{room.line}行目：ユーザー {room.user_id} がサーバーに見つかりません。")
+            continue
+        room.name = f"private-{names[room.user_id]}"
+        valid.append(room)
+
+    # カテゴリーのチャンネル数上限を超える分は作らない（作成できる行だけで数える）
+    space = max(0, CATEGORY_LIMIT - len(category.channels))
+    for room in valid[space:]:
+        errors.append(f"{room.line}行目：カテゴリーのチャンネル数が上限（{CATEGORY_LIMIT}）に達するため作成しません。")
+    valid = valid[:space]
+
+    batch = VCBatch(guild, category, private_vc_overwrites(guild, interaction.user), VC_MEMBER_ALLOW)
+    try:
+        await batch.run(valid)
+    finally:
+        # 作成できた分はまとめて管理対象に登録（ストアへの書き込みもバックグラウンドで1回にまとまる）
+        vcs = guild_vcs(guild.id)
+        for room in batch.created:
+            vcs[room.channel.id] = {"owner_id": interaction.user.id, "start": room.start, "end": room.end}
+            STORE.put_vc(room.channel.id, vcs[room.channel.id])
+        VC_SCHEDULER.schedule_many(((guild.id, room.channel.id), room.end) for room in batch.created)
+
+    lines = [f"✅ プライベートVCを {len(batch.created)} 件作成しました（失敗・スキップ：{len(batch.failed) + len(errors)} 件）"]
+    for room in sorted(batch.created, key=lambda room: room.line):
+        lines.append(
+            f"・{room.channel.mention} <@{room.user_id}>："
+            f"{room.start.strftime('%Y-%m-%d %H:%M')} ～ {room.end.strftime('%Y-%m-%d %H:%M')} JST"
+        )
+    for room in sorted(batch.failed, key=lambda room: room.line):
+        errors.append(f"{room.line}行目：作成に失敗しました（{room.error}）。")
+    lines.extend(f"⚠️ {error}" for error in errors)
+    if batch.created:
+        lines.append(f"オーナー：{interaction.user.mention}（このVCにいる状態で `/add_vc_user` 実行でユーザー追加できます）")
+    await interaction.followup.send(join_report(lines), ephemeral=True)
+
+@bot.tree.command(name="update_vc_time", description="プライベートVCの期間を上書き", **COMMAND_SCOPE)
 @requires_admin_role()
 @app_commands.describe(channel_id="対象VCのチャンネルID", period="例: 2025-08-08-21:00～2025-08-09-00:00")
 async def update_vc_time(interaction: discord.Interaction, channel_id: str, period: str):
@@ -354,12 +861,15 @@ async def update_vc_time(interaction: discord.Interaction, channel_id: str, peri
         await interaction.response.send_message("指定のチャンネルが見つからないか、ボイスチャンネルではありません。", ephemeral=True)
         return
 
-    if ch_id not in PRIVATE_VC:
+    vcs = guild_vcs(interaction.guild_id)
+    if ch_id not in vcs:
         # 既存VCでも強制的に管理対象にする（必要なら拒否にしてもOK）
-        PRIVATE_VC[ch_id] = {"owner_id": interaction.user.id, "start": start, "end": end}
+        vcs[ch_id] = {"owner_id": interaction.user.id, "start": start, "end": end}
     else:
-        PRIVATE_VC[ch_id]["start"] = start
-        PRIVATE_VC[ch_id]["end"] = end
+        vcs[ch_id]["start"] = start
+        vcs[ch_id]["end"] = end
+    STORE.put_vc(ch_id, vcs[ch_id])
+    VC_SCHEDULER.schedule((interaction.guild_id, ch_id), end)
 
     await interaction.response.send_message(
         f"✅ 期間を更新しました：{channel.mention}\n"
@@ -368,7 +878,7 @@ async def update_vc_time(interaction: discord.Interaction, channel_id: str, peri
     )
 
 # ========= 追加：/add_vc_user（チャンネル指定なし・入室中VCを自動判定） =========
-@bot.tree.command(name="add_vc_user", description="現在入っているプライベートVCにユーザーを追加", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="add_vc_user", description="現在入っているプライベートVCにユーザーを追加", **COMMAND_SCOPE)
 @app_commands.describe(user="追加したいユーザー")
 async def add_vc_user(interaction: discord.Interaction, user: discord.Member):
     member: discord.Member = interaction.user  # 実行者
@@ -378,7 +888,7 @@ async def add_vc_user(interaction: discord.Interaction, user: discord.Member):
 
     vc = member.voice.channel
     # PRIVATE_VC 管理対象か確認（作成済みや手動登録済み）
-    info = PRIVATE_VC.get(vc.id)
+    info = guild_vcs(interaction.guild_id).get(vc.id)
     # 管理対象でなくても「オーナー判定」をゆるくしたくなければここで弾く
     if info is None:
         await interaction.response.send_message("このVCは管理対象ではありません。", ephemeral=True)
@@ -399,45 +909,172 @@ async def add_vc_user(interaction: discord.Interaction, user: discord.Member):
     except Exception as e:
         await interaction.response.send_message(f"エラー：{e}", ephemeral=True)
 
-# ========= 自動削除ループ =========
-@tasks.loop(minutes=1)
-async def vc_cleanup_task():
-    """終了時刻を過ぎたプライベートVCを自動削除"""
-    if not bot.is_ready():
-        return
-    now = datetime.now(JST)
-    to_delete = []
-    for ch_id, meta in list(PRIVATE_VC.items()):
-        end: datetime = meta["end"]
-        if now >= end:
-            to_delete.append(ch_id)
+# ========= サーバー設定 =========
+@bot.tree.command(name="guild_config", description="このサーバーの設定（管理ロール・VCカテゴリー・クイズ）を表示／変更", **COMMAND_SCOPE)
+@requires_admin_role()
+@app_commands.describe(
+    admin_role="管理コマンドを実行できるロール",
+    vc_category="プライベートVCを作成するカテゴリー",
+    win_score="クイズの優勝に必要な点数",
+    season="通算ランキングのシーズン番号（変えると新しいシーズンを開始）",
+)
+async def guild_config(
+    interaction: discord.Interaction,
+    admin_role: discord.Role | None = None,
+    vc_category: discord.CategoryChannel | None = None,
+    win_score: app_commands.Range[int, 1, 100] | None = None,
+    season: app_commands.Range[int, 1] | None = None,
+):
+    changes = {}
+    if admin_role is not None:
+        changes["admin_role_id"] = admin_role.id
+    if vc_category is not None:
+        changes["vc_category_id"] = vc_category.id
+    if win_score is not None:
+        changes["win_score"] = win_score
+    if season is not None:
+        changes["season"] = season
+    config = GUILD_CONFIGS.update(interaction.guild_id, **changes) if changes else GUILD_CONFIGS.get(interaction.guild_id)
 
-    for ch_id in to_delete:
+    role = f"<@&{config.admin_role_id}>" if config.admin_role_id else "未設定（『サーバー管理』権限で判定）"
+    category = f"<#{config.vc_category_id}>" if config.vc_category_id else "未設定"
+    await interaction.response.send_message(
+        f"{'✅ 設定を更新しました' if changes else '現在の設定'}\n"
+        f"管理ロール：{role}\n"
+        f"VCカテゴリー：{category}\n"
+        f"優勝点数：{config.win_score}\n"
+        f"シーズン：{config.season}",
+        ephemeral=True,
+    )
+
+# ========= 自動削除スケジューラ =========
+async def expire_private_vc(key: tuple[int, int]):
+    """
+    終了時刻を迎えたプライベートVCを削除（key は (guild_id, channel_id)）。
+    削除に失敗した時（5xx・再試行切れの429など）は管理対象に残し、例外をスケジューラに返して再実行させる。
+    """
+    guild_id, ch_id = key
+    ch = bot.get_channel(ch_id)
+    if isinstance(ch, discord.VoiceChannel):
         try:
-            ch = bot.get_channel(ch_id)
-            if isinstance(ch, discord.VoiceChannel):
-                await ch.delete(reason="期間満了のため自動削除")
-        except Exception:
-            pass
-        finally:
-            PRIVATE_VC.pop(ch_id, None)
-        await asyncio.sleep(0.2)  # 連続削除のスロットリング
+            await ch.delete(reason="期間満了のため自動削除")
+        except discord.NotFound:
+            pass  # すでに削除済み
+    guild_vcs(guild_id).pop(ch_id, None)
+    STORE.delete_vc(ch_id)
+
+# 次の終了時刻まで眠るだけのスケジューラ（同時削除数は制限）
+VC_SCHEDULER = ExpiryScheduler(expire_private_vc, concurrency=5)
+
+# ========= メトリクス =========
+metrics.Gauge("bot_gateway_latency_seconds", "Gateway heartbeat latency", lambda: bot.latency)
+metrics.Gauge("bot_active_games", "Quiz games in progress", lambda: sum(map(len, games.values())))
+metrics.Gauge("bot_scheduled_vcs", "Private VCs waiting for expiry", lambda: len(VC_SCHEDULER))
+metrics.install_rate_limit_counter()
+
+# ========= コマンド同期 =========
+def command_tree_fingerprint(guild) -> str:
+    """guild（None ならグローバル）に登録されるコマンド定義（名前・引数・説明・チェック）のハッシュ"""
+    payload = []
+    for cmd in bot.tree.get_commands(guild=guild):
+        data = cmd.to_dict(bot.tree)
+        data["checks"] = [c.__qualname__ for c in getattr(cmd, "checks", [])]
+        payload.append(data)
+    payload.sort(key=lambda d: d["name"])
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+async def sync_commands(guild, *, force: bool = False) -> bool:
+    """定義が前回の同期から変わっている時だけ同期する（force で強制）。同期したら True"""
+    key = f"tree_fingerprint:{guild.id if guild else 'global'}"
+    fingerprint = command_tree_fingerprint(guild)
+    if not force and STORE.get_value(key) == fingerprint:
+        return False
+    await bot.tree.sync(guild=guild)
+    STORE.set_value(key, fingerprint)
+    return True
 
 # ========= 起動時処理 =========
+@bot.event
+async def setup_hook():
+    # ゲートウェイ接続前に同じイベントループ上でHTTPサーバーを起動
+    await keep_alive(bot, port=int(os.environ.get("PORT", 8080)))
+
+_state_restored = False
+
+def restore_state():
+    """
+    ストアから PRIVATE_VC / games を読み戻し、既に存在しないチャンネルの分は破棄。
+    復元前にコマンドで作成・更新された分はメモリ側が新しいので上書きしない。
+    """
+    # サーバーごとの振り分けはチャンネルの所属サーバーから決める
+    for ch_id, meta in STORE.load_vcs().items():
+        ch = bot.get_channel(ch_id)
+        if not isinstance(ch, discord.VoiceChannel):
+            STORE.delete_vc(ch_id)
+            continue
+        vcs = guild_vcs(ch.guild.id)
+        if ch_id in vcs:
+            continue
+        vcs[ch_id] = meta
+        VC_SCHEDULER.schedule((ch.guild.id, ch_id), meta["end"])  # 期限切れ分は即座に削除される
+    for ch_id, data in STORE.load_games().items():
+        ch = bot.get_channel(ch_id)
+        if ch is None or getattr(ch, "guild", None) is None:
+            STORE.delete_game(ch_id)
+            continue
+        games.setdefault(ch.guild.id, {}).setdefault(ch_id, GameState.from_dict(data))
+
 @bot.event
 async def on_ready():
+    global _state_restored
     bot.add_view(JoinView(None))  # クイズ用ボタンだけ残す
-    await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
-    if not vc_cleanup_task.is_running():
-        vc_cleanup_task.start()
+    # 復元と書き込み・期限処理の開始は、コマンド同期（ネットワーク待ち・失敗しうる）より先に済ませる
+    # on_ready は再接続のたびに呼ばれるので、復元は初回のみ
+    if not _state_restored:
+        restore_state()
+        _state_restored = True
+    STORE.start()
+    VC_SCHEDULER.start()
+    # 再接続のたびに呼ばれるので、定義に変更がなければ同期しない（レート制限対策）
+    await sync_commands(SYNC_GUILD)
     print(f"✅ Bot connected as {bot.user}")
 
+def can_sync():
+    """
+    !sync の実行権限。複数サーバーモードの同期はグローバル（全サーバー共通のレート制限）なので
+    Bot のオーナーだけ、単一サーバーモードはそのサーバーの管理ロール。
+    """
+    async def predicate(ctx: commands.Context) -> bool:
+        if MULTI_GUILD:
+            return await ctx.bot.is_owner(ctx.author)
+        return is_admin(ctx.author)
+    return commands.check(predicate)
+
 @bot.command()
+@can_sync()
 async def sync(ctx):
-    await bot.tree.sync(guild=ctx.guild)
+    await sync_commands(SYNC_GUILD if MULTI_GUILD else ctx.guild, force=True)
     await ctx.send("✅ コマンドを再同期しました")
 
+@sync.error
+async def sync_error(ctx, error):
+    if isinstance(error, commands.CheckFailure):
+        await ctx.send("このコマンドを実行する権限がありません。")
+        return
+    await ctx.send(f"⚠️ 同期に失敗しました：{error}")
+
+@bot.tree.command(name="perf_stats", description="コマンド／イベントの処理時間の統計を表示", **COMMAND_SCOPE)
+@requires_admin_role()
+async def perf_stats(interaction: discord.Interaction):
+    """直近の処理時間（秒）の p50/p95/p99、応答までの p95、平均REST呼び出し数"""
+    await interaction.response.send_message(f"```\n{tracing.format_stats()}\n```", ephemeral=True)
+
 # ========= 起動 =========
-keep_alive()
-bot.run(os.environ["DISCORD_TOKEN"])
+# 全コマンド・イベントを計測対象にする（定義がすべて終わった後に呼ぶこと）
+tracing.instrument(bot, guild=SYNC_GUILD)
+
+if __name__ == "__main__":
+    bot.run(os.environ["DISCORD_TOKEN"])
+    STORE.close()  # 未書き込み分を書き出して終了
 
@@ -0,0 +1,103 @@
+# member_names.py
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+# query_members(user_ids=...) の1リクエストあたり上限
+QUERY_CHUNK = 100
+
+
+class DisplayNameCache:
+    """最近のプレイヤーの表示名を保持する TTL 付き LRU"""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[tuple[int, int], tuple[float, str]] = OrderedDict()
+
+    def get(self, guild_id: int, user_id: int) -> str | None:
+        key = (guild_id, user_id)
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, name = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return name
+
+    def clear(self):
+        self._data.clear()
+
+    def put(self, guild_id: int, user_id: int, name: str):
+        key = (guild_id, user_id)
+        self._data[key] = (time.monotonic() + self.ttl, name)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+NAME_CACHE = DisplayNameCache()
+
+
+def remember(member: discord.Member):
+    """クイズ参加者など、後でランキングに出るメンバーの表示名を控えておく（メンバーキャッシュ非依存）"""
+    NAME_CACHE.put(member.guild.id, member.id, member.display_name)
+
+
+def needs_fetch(guild: discord.Guild, user_ids) -> bool:
+    """REST/ゲートウェイ問い合わせが必要なユーザーが含まれるか"""
+    return any(
+        guild.get_member(uid) is None and NAME_CACHE.get(guild.id, uid) is None
+        for uid in user_ids
+    )
+
+
+async def lookup_display_names(
+    guild: discord.Guild, user_ids, *, cache: bool = True
+) -> tuple[dict[int, str], set[int]]:
+    """
+    user_id → 表示名 をまとめて解決し、(解決できた分, 退出済みなどで解決できなかった user_id) を返す。
+    ① ゲートウェイのメンバーキャッシュ → ② 名前キャッシュ → ③ 取りこぼしだけ
+    query_members でチャンク取得（失敗時は fetch_member を並列）の順。
+    cache=False なら取得したメンバーをゲートウェイのキャッシュに載せない（名前キャッシュにだけ残す）。
+    """
+    names: dict[int, str] = {}
+    misses: list[int] = []
+    for uid in user_ids:
+        member = guild.get_member(uid)
+        if member is not None:
+            names[uid] = member.display_name
+            NAME_CACHE.put(guild.id, uid, member.display_name)
+            continue
+        cached = NAME_CACHE.get(guild.id, uid)
+        if cached is not None:
+            names[uid] = cached
+        else:
+            misses.append(uid)
+
+    for i in range(0, len(misses), QUERY_CHUNK):
+        chunk = misses[i:i + QUERY_CHUNK]
+        try:
+            members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=cache)
+        except (asyncio.TimeoutError, discord.ClientException):
+            results = await asyncio.gather(
+                *(guild.fetch_member(uid) for uid in chunk), return_exceptions=True
+            )
+            members = [m for m in results if isinstance(m, discord.Member)]
+        for member in members:
+            names[member.id] = member.display_name
+            NAME_CACHE.put(guild.id, member.id, member.display_name)
+
+    return names, {uid for uid in misses if uid not in names}
+
+
+async def resolve_display_names(guild: discord.Guild, user_ids, *, cache: bool = True) -> dict[int, str]:
+    """lookup_display_names と同じ順で解決し、解決できなかったユーザーは「ID:user_id」で埋める"""
+    names, missing = await lookup_display_names(guild, user_ids, cache=cache)
+    for uid in missing:
+        names[uid] = f"ID:{uid}"
+    return names
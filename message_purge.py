@@ -0,0 +1,220 @@
+# message_purge.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+import metrics
+from rate_limit import retry_rate_limited
+
+# 一括削除(delete_messages)は14日以内のメッセージのみ。境界ぎわは余裕を持って個別削除へ回す
+BULK_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+# 1ページ＝delete_messages 1回分の上限
+PAGE_SIZE = 100
+
+
+def cursor_key(channel_id: int, after: datetime, before: datetime) -> str:
+    """再開用カーソルの保存キー（チャンネル＋対象期間ごと）"""
+    return f"purge:{channel_id}:{int(after.timestamp())}:{int(before.timestamp())}"
+
+
+def scope_key(scope_id: int, after: datetime, before: datetime) -> str:
+    """複数チャンネル削除の完了済みチャンネル一覧の保存キー（サーバー／カテゴリー＋対象期間ごと）"""
+    return f"purge_scope:{scope_id}:{int(after.timestamp())}:{int(before.timestamp())}"
+
+
+async def iter_pages(channel, after, before, size: int = PAGE_SIZE):
+    """期間内の履歴を古い順に size 件ずつのリストで返す（全件をメモリに溜めない）"""
+    page = []
+    async for msg in channel.history(limit=None, after=after, before=before, oldest_first=True):
+        page.append(msg)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+# ========= 削除エンジン =========
+class PurgeJob:
+    """
+    チャンネルの期間内メッセージを削除するジョブ。
+    - 履歴を古い順に100件ずつのページで読み、次ページの取得と削除を並行させる
+    - 14日以内のものは delete_messages で100件まとめて削除
+    - それより古いものは同時実行数を制限したワーカーで個別削除
+      （待ち時間は discord.py がレート制限ヘッダーから決める。固定sleepはしない）
+    - ページごとに最後のメッセージIDをカーソルとして store に保存し、中断後はそこから再開
+    semaphore を渡すと、削除リクエストの同時実行数を他のジョブと共有する。
+    """
+
+    def __init__(
+        self,
+        channel,
+        after: datetime,
+        before: datetime,
+        *,
+        store,
+        concurrency: int = 5,
+        semaphore: asyncio.Semaphore | None = None,
+        on_progress=None,
+    ):
+        self.channel = channel
+        self.store = store
+        self.after = after
+        self.before = before
+        self.on_progress = on_progress  # async def (job) -> None
+        self.key = cursor_key(channel.id, after, before)
+        self.deleted = 0
+        self.failed = 0
+        self.resumed = False
+        self.elapsed = 0.0
+        self._sem = semaphore or asyncio.Semaphore(concurrency)
+
+    async def run(self) -> int:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        start_after = self.after
+        cursor = self.store.get_value(self.key)
+        if cursor is not None:
+            start_after = discord.Object(id=cursor)
+            self.resumed = True
+
+        pages: asyncio.Queue = asyncio.Queue(maxsize=2)
+        producer = asyncio.create_task(self._produce(pages, start_after))
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page  # 履歴取得側の失敗
+                await self._delete_page(page)
+                self.store.set_value(self.key, page[-1].id)
+                if self.on_progress is not None:
+                    await self.on_progress(self)
+        finally:
+            producer.cancel()
+            self.elapsed = loop.time() - started
+        self.store.delete_value(self.key)
+        return self.deleted
+
+    async def _produce(self, pages: asyncio.Queue, start_after):
+        try:
+            async for page in iter_pages(self.channel, start_after, self.before):
+                await pages.put(page)
+        except Exception as e:
+            await pages.put(e)
+            return
+        await pages.put(None)
+
+    async def _delete_page(self, page):
+        cutoff = datetime.now(timezone.utc) - BULK_MAX_AGE
+        recent = [m for m in page if m.created_at > cutoff]
+        old = [m for m in page if m.created_at <= cutoff]
+
+        tasks = [self._delete_one(m) for m in old]
+        if len(recent) >= 2:
+            tasks.append(self._delete_bulk(recent))
+        else:
+            tasks.extend(self._delete_one(m) for m in recent)
+        await asyncio.gather(*tasks)
+
+    async def _delete_bulk(self, messages):
+        try:
+            async with self._sem:
+                await self.channel.delete_messages(messages, reason="delete_range")
+            self.deleted += len(messages)
+            metrics.MESSAGES_DELETED.inc(len(messages))
+        except discord.HTTPException:
+            # 一括削除に失敗したページは個別削除に切り替え
+            await asyncio.gather(*(self._delete_one(m) for m in messages))
+
+    async def _delete_one(self, msg):
+        async with self._sem:
+            try:
+                await retry_rate_limited(msg.delete)
+            except discord.NotFound:
+                return  # すでに削除済み
+            except discord.HTTPException:
+                self.failed += 1  # 削除不能メッセージ・429の再試行切れは数えてスキップ
+                return
+            self.deleted += 1
+            metrics.MESSAGES_DELETED.inc()
+
+
+class MultiChannelPurge:
+    """
+    複数チャンネル（カテゴリー内／サーバー全体）の期間内メッセージを並行して削除する。
+    - 履歴を読むチャンネルは同時に parallel 個まで。削除リクエストは全チャンネル合計で concurrency 件まで
+    - 途中位置はチャンネルごとの PurgeJob のカーソルに、完了したチャンネルは key に記録し、
+      同じ範囲で再実行すると完了済みチャンネルを飛ばして続きから再開する
+    - 1チャンネルの失敗（権限不足など）は errors に記録し、残りのチャンネルは続ける
+    """
+
+    def __init__(
+        self,
+        channels,
+        after: datetime,
+        before: datetime,
+        *,
+        store,
+        key: str,
+        concurrency: int = 10,
+        parallel: int = 4,
+        on_progress=None,
+    ):
+        self.channels = list(channels)
+        self.after = after
+        self.before = before
+        self.store = store
+        self.key = key
+        self.parallel = parallel
+        self.on_progress = on_progress  # async def (purge) -> None
+        self.jobs: dict[int, PurgeJob] = {}
+        self.errors: dict[int, str] = {}
+        self.skipped: list[int] = []  # 前回までに完了していたチャンネル
+        self.finished = 0
+        self.elapsed = 0.0
+        self._sem = asyncio.Semaphore(concurrency)
+
+    @property
+    def deleted(self) -> int:
+        return sum(job.deleted for job in self.jobs.values())
+
+    @property
+    def failed(self) -> int:
+        return sum(job.failed for job in self.jobs.values())
+
+    async def run(self) -> int:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        done = set(self.store.get_value(self.key) or [])
+        self.skipped = [ch.id for ch in self.channels if ch.id in done]
+        gate = asyncio.Semaphore(self.parallel)
+
+        async def report(_job=None):
+            if self.on_progress is not None:
+                await self.on_progress(self)
+
+        async def purge(channel):
+            async with gate:
+                job = self.jobs[channel.id] = PurgeJob(
+                    channel, self.after, self.before, store=self.store, semaphore=self._sem, on_progress=report
+                )
+                try:
+                    await job.run()
+                except discord.HTTPException as e:
+                    self.errors[channel.id] = f"{e.status} {e.text}".strip()
+                    return
+                done.add(channel.id)
+                self.store.set_value(self.key, sorted(done))
+                self.finished += 1
+                await report()
+
+        try:
+            await asyncio.gather(*(purge(ch) for ch in self.channels if ch.id not in done))
+        finally:
+            self.elapsed = loop.time() - started
+        if not self.errors:
+            self.store.delete_value(self.key)
+        return self.deleted
@@ -0,0 +1,150 @@
+# metrics.py
+import asyncio
+import bisect
+import logging
+import threading
+
+# Prometheus テキスト形式で出力するだけの最小限のメトリクス実装
+
+
+def _fmt_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """値を都度計算する関数を渡すゲージ（ラベルなし）"""
+    kind = "gauge"
+
+    def __init__(self, name, help, func):
+        super().__init__(name, help)
+        self.func = func
+
+    def _samples(self):
+        return [f"{self.name} {float(self.func())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10)):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # ラベル → (各バケットの件数, 合計, 件数)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self):
+        lines = []
+        names = self.labelnames + ("le",)
+        for key, (counts, total, n) in self._values.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(names, key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(names, key + ('+Inf',))} {n}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for m in REGISTRY for line in m.render()) + "\n"
+
+
+# ========= 共通メトリクス =========
+COMMAND_LATENCY = Histogram(
+    "bot_command_latency_seconds", "App command handler latency", ("command",)
+)
+RATE_LIMITED = Counter(
+    "bot_rate_limited_total", "HTTP 429 responses received from Discord", ("scope",)
+)
+MESSAGES_DELETED = Counter(
+    "bot_messages_deleted_total", "Messages deleted by purge jobs"
+)
+MESSAGES_COALESCED = Counter(
+    "bot_messages_coalesced_total", "Outbound sends merged into another message"
+)
+
+
+class _RateLimitLogHandler(logging.Handler):
+    """
+    discord.py の 429 警告ログを数える（ライブラリ側で再試行されるため例外にならない）。
+    グローバル制限の 429 は「responded with 429」の直後（await を挟まず）に「Global rate limit」も出るので、
+    route の行はイベントループの次の周回まで保留し、その間に global の行が来たら global として1回だけ数える。
+    """
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self._pending = 0  # まだ route として数えていない 429
+
+    def emit(self, record: logging.LogRecord):
+        msg = record.msg if isinstance(record.msg, str) else ""
+        if "responded with 429" in msg:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                RATE_LIMITED.inc(scope="route")
+                return
+            self._pending += 1
+            loop.call_soon(self._count_route)
+        elif msg.startswith("Global rate limit"):
+            if self._pending:
+                self._pending -= 1
+            RATE_LIMITED.inc(scope="global")
+
+    def _count_route(self):
+        if self._pending:
+            self._pending -= 1
+            RATE_LIMITED.inc(scope="route")
+
+
+def install_rate_limit_counter():
+    logging.getLogger("discord.http").addHandler(_RateLimitLogHandler(level=logging.WARNING))
@@ -0,0 +1,167 @@
+# outbound.py
+import asyncio
+import logging
+
+import discord
+
+import metrics
+import tracing
+
+log = logging.getLogger(__name__)
+
+# 優先度（小さいほど先に送る）
+QUESTION = 0
+CHATTER = 1
+
+# 問題以外の送信は、この秒数だけ後続を待ってから1通にまとめる
+COALESCE_WINDOW = 0.05
+
+# 1メッセージあたりの Discord の上限
+MAX_CONTENT = 2000
+MAX_EMBEDS = 10
+MAX_FILES = 10
+
+
+class _Outgoing:
+    __slots__ = ("content", "embeds", "files", "view", "priority", "urgent", "future")
+
+    def __init__(self, content, embeds, files, view, priority, urgent, future):
+        self.content = content
+        self.embeds = embeds
+        self.files = files
+        self.view = view
+        self.priority = priority
+        self.urgent = urgent  # 時間窓を待たずに送る
+        self.future = future
+
+
+def _consume(future: asyncio.Future):
+    # 待たれていない送信の失敗で "exception was never retrieved" を出さない（ログは送信側で出す）
+    if not future.cancelled():
+        future.exception()
+
+
+class ChannelOutbox:
+    """
+    1チャンネル分の送信キュー。短い間に出された送信（正解の通知＋次の問題など）を1通にまとめて送る。
+    送信は1件ずつ直列なので、チャンネル単位のレート制限バケットに同時に複数のリクエストを積まない。
+    送信中に溜まった分は次の1通にまとめられ、上限に収まらない時は問題を優先して先に送る。
+    問題や完了を待たれている送信が入った時点で、時間窓を待たずに送信する。
+    """
+
+    def __init__(self, channel, *, window: float = COALESCE_WINDOW):
+        self.channel = channel
+        self.window = window
+        self._pending: list[_Outgoing] = []
+        self._wake = asyncio.Event()
+        self._urgent = asyncio.Event()  # 待ち行列にすぐ送るものがある
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    def post(
+        self,
+        content=None,
+        *,
+        embed=None,
+        file=None,
+        view=None,
+        priority: int = CHATTER,
+        flush: bool = False,
+    ) -> asyncio.Future:
+        """送信を予約し、送られたメッセージを結果に持つ Future を返す（待たなくてもよい）"""
+        urgent = flush or priority == QUESTION
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume)
+        self._pending.append(_Outgoing(
+            content,
+            [embed] if embed is not None else [],
+            [file] if file is not None else [],
+            view,
+            priority,
+            urgent,
+            future,
+        ))
+        self._wake.set()
+        if urgent:
+            self._urgent.set()
+        if self._task is None or self._task.done():
+            self._task = tracing.spawn(self._run())
+        return future
+
+    async def send(self, content=None, **kwargs) -> discord.Message:
+        """送信して、送られたメッセージを返す（それまでに予約された分も同じ1通にまとまる）"""
+        return await self.post(content, flush=True, **kwargs)
+
+    def close(self):
+        """待ち行列に残っている分を送り終えたら停止する"""
+        self._closed = True
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            if not self._pending:
+                return  # close() された
+            if not self._urgent.is_set() and not self._closed:
+                try:
+                    await asyncio.wait_for(self._urgent.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._take()
+            if not self._pending:
+                self._wake.clear()
+                if self._closed:
+                    self._wake.set()
+            if not any(item.urgent for item in self._pending):
+                self._urgent.clear()
+            await self._send(batch)
+
+    def _take(self) -> list[_Outgoing]:
+        """1通に収まる分を取り出す（問題を優先して選び、並びは予約順のまま）"""
+        picked = set()
+        length = embeds = files = views = 0
+        for item in sorted(self._pending, key=lambda item: item.priority):
+            add = len(item.content or "") + (1 if length and item.content else 0)
+            if picked and (
+                length + add > MAX_CONTENT
+                or embeds + len(item.embeds) > MAX_EMBEDS
+                or files + len(item.files) > MAX_FILES
+                or views + (item.view is not None) > 1
+            ):
+                continue
+            picked.add(id(item))
+            length += add
+            embeds += len(item.embeds)
+            files += len(item.files)
+            views += item.view is not None
+        batch = [item for item in self._pending if id(item) in picked]
+        self._pending = [item for item in self._pending if id(item) not in picked]
+        return batch
+
+    async def _send(self, batch: list[_Outgoing]):
+        kwargs = {}
+        contents = [item.content for item in batch if item.content]
+        if contents:
+            kwargs["content"] = "\n".join(contents)
+        embeds = [embed for item in batch for embed in item.embeds]
+        if embeds:
+            kwargs["embeds"] = embeds
+        files = [file for item in batch for file in item.files]
+        if files:
+            kwargs["files"] = files
+        for item in batch:
+            if item.view is not None:
+                kwargs["view"] = item.view
+        try:
+            message = await self.channel.send(**kwargs)
+        except Exception as e:
+            log.exception("outbound send failed in channel %s", self.channel.id)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        if len(batch) > 1:
+            metrics.MESSAGES_COALESCED.inc(len(batch) - 1)
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(message)
@@ -0,0 +1,104 @@
+# quiz_deck.py
+import random
+
+N_POKEMON = 151
+
+# 難易度の基準になる「よく知られたポケモン」（御三家・ピカチュウ・イーブイ系など）
+EASY_IDS = frozenset({
+    1, 2, 3, 4, 5, 6, 7, 8, 9, 25, 26, 39, 52, 54, 94, 129, 130,
+    131, 133, 134, 135, 136, 143, 144, 145, 146, 150, 151,
+})
+
+# easy: 2匹とも EASY_IDS / hard: 2匹とも EASY_IDS 以外 / normal: 制限なし
+TIERS = ("easy", "normal", "hard")
+
+
+class QuestionDeck:
+    """
+    フュージョンの組み合わせ（k×k 通り）を、シード付きの擬似乱数置換で重複なく1周ずつ出題する山札。
+    置換は mod 2^b の全周期 LCG（a ≡ 1 mod 4, c 奇数）で作り、範囲外の値は読み飛ばす（cycle walking）。
+    保持するのはシードと現在位置だけなので、メモリは組み合わせ数によらず O(1)。
+    1周し終わったら epoch を進めて別の置換で次の周に入る。
+    """
+
+    def __init__(
+        self,
+        seed: int | None = None,
+        *,
+        id_min: int = 1,
+        id_max: int = N_POKEMON,
+        allow_self: bool = False,
+        tier: str = "normal",
+    ):
+        if not 1 <= id_min <= id_max <= N_POKEMON:
+            raise ValueError("図鑑番号の範囲が不正です。")
+        if tier not in TIERS:
+            raise ValueError(f"難易度は {', '.join(TIERS)} のいずれかです。")
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.id_min = id_min
+        self.id_max = id_max
+        self.allow_self = allow_self
+        self.tier = tier
+        self._k = id_max - id_min + 1
+        self._n = self._k * self._k
+        self._m = 1 << max(2, (self._n - 1).bit_length())
+        self._start_epoch(0)
+        if not any(self._accepts(self.id_min + i, self.id_min + j) for i in range(self._k) for j in range(self._k)):
+            raise ValueError("条件に合う組み合わせがありません。")
+
+    def _start_epoch(self, epoch: int):
+        rng = random.Random(f"{self.seed}:{epoch}")
+        self.epoch = epoch
+        self._a = 4 * rng.randrange(self._m // 4) + 1
+        self._c = 2 * rng.randrange(self._m // 2) + 1
+        self.state = rng.randrange(self._m)
+        self.steps = 0  # この周で進めた回数（m 回で全値を1度ずつ通る）
+
+    def _accepts(self, id1: int, id2: int) -> bool:
+        if not self.allow_self and id1 == id2:
+            return False
+        if self.tier == "easy":
+            return id1 in EASY_IDS and id2 in EASY_IDS
+        if self.tier == "hard":
+            return id1 not in EASY_IDS and id2 not in EASY_IDS
+        return True
+
+    def draw(self) -> tuple[int, int]:
+        """次の組み合わせ (id1, id2)"""
+        while True:
+            if self.steps >= self._m:
+                self._start_epoch(self.epoch + 1)
+            self.state = (self._a * self.state + self._c) % self._m
+            self.steps += 1
+            if self.state >= self._n:
+                continue
+            i, j = divmod(self.state, self._k)
+            pair = (self.id_min + i, self.id_min + j)
+            if self._accepts(*pair):
+                return pair
+
+    def to_dict(self) -> dict:
+        return {
+            "seed": self.seed,
+            "id_min": self.id_min,
+            "id_max": self.id_max,
+            "allow_self": self.allow_self,
+            "tier": self.tier,
+            "epoch": self.epoch,
+            "state": self.state,
+            "steps": self.steps,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuestionDeck":
+        deck = cls(
+            data["seed"],
+            id_min=data["id_min"],
+            id_max=data["id_max"],
+            allow_self=data["allow_self"],
+            tier=data["tier"],
+        )
+        deck._start_epoch(data["epoch"])
+        deck.state = data["state"]
+        deck.steps = data["steps"]
+        return deck
@@ -0,0 +1,20 @@
+# rate_limit.py
+import asyncio
+
+import discord
+
+
+async def retry_rate_limited(call, *, attempts: int = 3):
+    """
+    call()（コルーチンを返す関数）を実行して結果を返す。
+    ライブラリ側の再試行を使い切った 429 はヘッダーの Retry-After だけ待って、合計 attempts 回まで呼び直す。
+    429 以外の HTTPException と、最後の試行の 429 はそのまま送出する。
+    """
+    for _ in range(attempts - 1):
+        try:
+            return await call()
+        except discord.HTTPException as e:
+            if e.status != 429:
+                raise
+            await asyncio.sleep(float(e.response.headers.get("Retry-After", 1.0)))
+    return await call()
@@ -0,0 +1,182 @@
+# state_store.py
+import asyncio
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import tracing
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS private_vc (
+    channel_id INTEGER PRIMARY KEY,
+    owner_id   INTEGER NOT NULL,
+    start      TEXT NOT NULL,
+    end        TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    channel_id INTEGER PRIMARY KEY,
+    data       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS kv (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+    guild_id INTEGER NOT NULL,
+    season   INTEGER NOT NULL,
+    user_id  INTEGER NOT NULL,
+    points   INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, season, user_id)
+);
+"""
+
+
+class StateStore:
+    """
+    PRIVATE_VC・クイズ進行状況などを保存するローカル SQLite ストア（WALモード）。
+    書き込みはメモリ上の保留表に積むだけで即座に戻り、バックグラウンドの
+    フラッシュタスクが一定間隔でまとめて1トランザクションで書き出す（write-behind）。
+    kv テーブル（サーバー設定・削除の再開位置など）は起動時に全件メモリに読み込み、
+    ハンドラから呼ばれる get_value がディスクやフラッシュ中のロックを待たないようにする。
+    """
+
+    def __init__(self, path: str = "bot_state.db", flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # kv の値（JSON 文字列のまま持ち、取り出すたびに新しいオブジェクトにする）
+        self._kv: dict[str, str] = dict(self._conn.execute("SELECT key, value FROM kv").fetchall())
+        # (テーブル, キー) → 書き込む行（None は削除）
+        self._pending: dict[tuple[str, object], tuple | None] = {}
+        self._dirty = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    # ---------- 書き込み（ノンブロッキング） ----------
+    def put_vc(self, channel_id: int, meta: dict):
+        self._stage("private_vc", channel_id, (
+            channel_id, meta["owner_id"], meta["start"].isoformat(), meta["end"].isoformat()
+        ))
+
+    def delete_vc(self, channel_id: int):
+        self._stage("private_vc", channel_id, None)
+
+    def put_game(self, channel_id: int, data: dict):
+        self._stage("games", channel_id, (channel_id, json.dumps(data)))
+
+    def delete_game(self, channel_id: int):
+        self._stage("games", channel_id, None)
+
+    def set_value(self, key: str, value):
+        self._kv[key] = json.dumps(value)
+        self._stage("kv", key, (key, self._kv[key]))
+
+    def delete_value(self, key: str):
+        self._kv.pop(key, None)
+        self._stage("kv", key, None)
+
+    def put_score(self, guild_id: int, season: int, user_id: int, points: int):
+        self._stage("leaderboard", (guild_id, season, user_id), (guild_id, season, user_id, points))
+
+    def _stage(self, table: str, key, row):
+        self._pending[(table, key)] = row
+        self._dirty.set()
+
+    # ---------- 読み込み ----------
+    def get_value(self, key: str, default=None):
+        value = self._kv.get(key)
+        return default if value is None else json.loads(value)
+
+    def load_vcs(self) -> dict[int, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT channel_id, owner_id, start, end FROM private_vc").fetchall()
+        rows = self._overlay("private_vc", {row[0]: row for row in rows})
+        return {
+            ch_id: {
+                "owner_id": owner_id,
+                "start": datetime.fromisoformat(start),
+                "end": datetime.fromisoformat(end),
+            }
+            for ch_id, owner_id, start, end in rows.values()
+        }
+
+    def load_games(self) -> dict[int, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT channel_id, data FROM games").fetchall()
+        rows = self._overlay("games", {row[0]: row for row in rows})
+        return {ch_id: json.loads(data) for ch_id, data in rows.values()}
+
+    def _overlay(self, table: str, rows: dict) -> dict:
+        """まだ書き出されていない更新・削除を、読み込んだ行（キー → 行）に重ねる"""
+        for (t, key), row in list(self._pending.items()):
+            if t != table:
+                continue
+            if row is None:
+                rows.pop(key, None)
+            else:
+                rows[key] = row
+        return rows
+
+    def load_scores(self, guild_id: int, season: int) -> dict[int, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, points FROM leaderboard WHERE guild_id = ? AND season = ?",
+                (guild_id, season),
+            ).fetchall()
+        scores = dict(rows)
+        # まだ書き出されていない更新を重ねる
+        for (table, key), row in list(self._pending.items()):
+            if table == "leaderboard" and key[:2] == (guild_id, season):
+                scores[key[2]] = row[3]
+        return scores
+
+    # ---------- フラッシュ ----------
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = tracing.spawn(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.flush_interval)  # この間の書き込みをまとめる
+            self._dirty.clear()
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except sqlite3.Error:
+                # 失敗分は保留表に戻して次回再試行（その間の新しい書き込みを優先）
+                self._pending = {**batch, **self._pending}
+                self._dirty.set()
+
+    def flush(self):
+        """保留中の書き込みを同期的に書き出す（終了時用）"""
+        batch, self._pending = self._pending, {}
+        self._write(batch)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, batch: dict):
+        if not batch:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for (table, key), row in batch.items():
+                    if row is None:
+                        col = "key" if table == "kv" else "channel_id"
+                        self._conn.execute(f"DELETE FROM {table} WHERE {col} = ?", (key,))
+                    else:
+                        marks = ", ".join("?" * len(row))
+                        self._conn.execute(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", row)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
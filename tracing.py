@@ -0,0 +1,220 @@
+# tracing.py
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from contextvars import Context, ContextVar
+
+import discord
+from discord.webhook.async_ import async_context
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# インタラクションは3秒以内に応答が必要。これを超えたら遅延レポートを出す（秒）
+SLOW_THRESHOLD = 2.5
+# ハンドラごとに保持する直近サンプル数（メモリ上限）
+WINDOW = 1024
+
+EVENT_LATENCY = metrics.Histogram(
+    "bot_event_latency_seconds", "Gateway event handler latency", ("event",)
+)
+STEP_LATENCY = metrics.Histogram(
+    "bot_step_latency_seconds", "Handler latency for work run outside the gateway event", ("step",)
+)
+
+
+class _Trace:
+    __slots__ = ("start", "ack", "rest_calls", "rest_time")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ack = None  # 応答（send_message/defer等）までの秒数
+        self.rest_calls = 0
+        self.rest_time = 0.0
+
+
+_current: ContextVar[_Trace | None] = ContextVar("trace", default=None)
+
+
+class HandlerStats:
+    """1ハンドラ分の直近 WINDOW 件の計測値"""
+
+    def __init__(self):
+        self.count = 0
+        self.wall = deque(maxlen=WINDOW)
+        self.ack = deque(maxlen=WINDOW)
+        self.rest_calls = deque(maxlen=WINDOW)
+        self.rest_time = deque(maxlen=WINDOW)
+
+    def add(self, wall: float, trace: _Trace):
+        self.count += 1
+        self.wall.append(wall)
+        if trace.ack is not None:
+            self.ack.append(trace.ack)
+        self.rest_calls.append(trace.rest_calls)
+        self.rest_time.append(trace.rest_time)
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+STATS: dict[str, HandlerStats] = {}
+
+
+def _record(name: str, trace: _Trace, histogram: metrics.Histogram, label: str):
+    wall = time.perf_counter() - trace.start
+    STATS.setdefault(name, HandlerStats()).add(wall, trace)
+    histogram.observe(wall, **{label: name.split(":", 1)[1]})
+    waited = trace.ack if trace.ack is not None else wall
+    if waited >= SLOW_THRESHOLD:
+        log.warning(
+            "slow handler %s: wall=%.3fs ack=%s rest_calls=%d rest_time=%.3fs",
+            name, wall, "-" if trace.ack is None else f"{trace.ack:.3f}s",
+            trace.rest_calls, trace.rest_time,
+        )
+
+
+# ========= 応答までの時間の計測 =========
+class _TracedResponse(discord.InteractionResponse):
+    """最初の応答が完了した時刻をトレースに記録する InteractionResponse"""
+
+    __slots__ = ()
+
+    def _mark(self):
+        trace = _current.get()
+        if trace is not None and trace.ack is None:
+            trace.ack = time.perf_counter() - trace.start
+
+    async def send_message(self, *args, **kwargs):
+        result = await super().send_message(*args, **kwargs)
+        self._mark()
+        return result
+
+    async def defer(self, *args, **kwargs):
+        result = await super().defer(*args, **kwargs)
+        self._mark()
+        return result
+
+    async def edit_message(self, *args, **kwargs):
+        result = await super().edit_message(*args, **kwargs)
+        self._mark()
+        return result
+
+    async def send_modal(self, *args, **kwargs):
+        result = await super().send_modal(*args, **kwargs)
+        self._mark()
+        return result
+
+
+# ========= ラッパー =========
+def _wrap_command(command):
+    callback = command._callback
+    name = f"command:{command.qualified_name}"
+
+    @functools.wraps(callback)
+    async def traced(interaction: discord.Interaction, *args, **kwargs):
+        trace = _Trace()
+        token = _current.set(trace)
+        # interaction.response は最初のアクセス時に生成されるキャッシュ属性なので、先に差し込む
+        interaction._cs_response = _TracedResponse(interaction)
+        try:
+            return await callback(interaction, *args, **kwargs)
+        finally:
+            _current.reset(token)
+            _record(name, trace, metrics.COMMAND_LATENCY, "command")
+
+    command._callback = traced
+
+
+def _wrap_event(bot, attr: str):
+    handler = getattr(bot, attr)
+    name = f"event:{attr[3:]}"
+
+    @functools.wraps(handler)
+    async def traced(*args, **kwargs):
+        trace = _Trace()
+        token = _current.set(trace)
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            _record(name, trace, EVENT_LATENCY, "event")
+
+    setattr(bot, attr, traced)
+
+
+def spawn(coro) -> asyncio.Task:
+    """
+    ハンドラから長く動き続けるバックグラウンドタスクを起動する。
+    起動元のトレースを引き継がない空のコンテキストで動かす（中の処理を計測するなら run_traced を通す）。
+    """
+    return asyncio.create_task(coro, context=Context())
+
+
+async def run_traced(name: str, func, *args):
+    """
+    イベントハンドラから切り離されたタスク（チャンネルアクターなど）で動く処理を name として計測する。
+    そうしたタスクは起動元のトレースを引き継がないので、計測したい処理はここを通す。
+    """
+    trace = _Trace()
+    token = _current.set(trace)
+    try:
+        return await func(*args)
+    finally:
+        _current.reset(token)
+        _record(name, trace, STEP_LATENCY, "step")
+
+
+def _wrap_rest(owner):
+    request = owner.request
+
+    @functools.wraps(request)
+    async def traced(*args, **kwargs):
+        trace = _current.get()
+        if trace is None:
+            return await request(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await request(*args, **kwargs)
+        finally:
+            trace.rest_calls += 1
+            trace.rest_time += time.perf_counter() - start
+
+    owner.request = traced
+
+
+def instrument(bot, guild: discord.abc.Snowflake | None = None):
+    """
+    bot.tree の全コマンド（グローバル＋guild）と @bot.event で登録された全イベントを計測対象にする。
+    REST 呼び出しは bot.http（通常API）と Webhook アダプタ（応答・followup）の両方を数える。
+    """
+    scopes = [None] if guild is None else [None, guild]
+    for scope in scopes:
+        for command in bot.tree.walk_commands(guild=scope):
+            if isinstance(command, discord.app_commands.Command):
+                _wrap_command(command)
+    for attr, value in list(vars(bot).items()):
+        if attr.startswith("on_") and callable(value):
+            _wrap_event(bot, attr)
+    _wrap_rest(bot.http)
+    _wrap_rest(async_context.get())
+
+
+def format_stats() -> str:
+    """現在の統計を等幅表にまとめる"""
+    lines = [f"{'handler':<28}{'n':>6}{'p50':>8}{'p95':>8}{'p99':>8}{'ack95':>8}{'rest':>6}"]
+    for name, st in sorted(STATS.items()):
+        rest = sum(st.rest_calls) / len(st.rest_calls) if st.rest_calls else 0.0
+        lines.append(
+            f"{name[:27]:<28}{st.count:>6}"
+            f"{percentile(st.wall, 0.50):>8.3f}{percentile(st.wall, 0.95):>8.3f}"
+            f"{percentile(st.wall, 0.99):>8.3f}{percentile(st.ack, 0.95):>8.3f}{rest:>6.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,101 @@
+# vc_batch.py
+import asyncio
+import csv
+import io
+from datetime import datetime
+
+import discord
+
+from rate_limit import retry_rate_limited
+
+# 1カテゴリーに置けるチャンネル数の上限（Discord 側の制限）
+CATEGORY_LIMIT = 50
+
+
+class RoomRequest:
+    """CSV の1行分（作成後は channel、失敗時は error が入る）"""
+
+    def __init__(self, line: int, user_id: int, start: datetime, end: datetime):
+        self.line = line
+        self.user_id = user_id
+        self.start = start
+        self.end = end
+        self.name: str | None = None
+        self.channel: discord.VoiceChannel | None = None
+        self.error: str | None = None
+
+
+def _user_id(cell: str) -> str:
+    """「123」「<@123>」「<@!123>」から ID 部分を取り出す"""
+    if cell.startswith("<@") and cell.endswith(">"):
+        cell = cell[2:-1].removeprefix("!")
+    return cell
+
+
+def parse_rows(text: str, parse_period) -> tuple[list[RoomRequest], list[str]]:
+    """
+    「user_id,期間」の CSV を読み、作成依頼の一覧と読めなかった行のエラーを返す。
+    user_id はメンションの形（<@123> / <@!123>）でもよい。期間は parse_period(str) -> (開始, 終了) で解釈する。
+    1行目は user_id として読めない時だけ見出し行とみなして読み飛ばす。空行も読み飛ばす。
+    """
+    rooms: list[RoomRequest] = []
+    errors: list[str] = []
+    for line, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        row = [cell.strip() for cell in row]
+        if not any(row):
+            continue
+        user_id = _user_id(row[0])
+        if not user_id.isdigit():
+            if line != 1:  # 1行目なら見出し行
+                errors.append(f"{line}行目：user_id が数値ではありません（{row[0]}）。")
+            continue
+        if len(row) < 2:
+            errors.append(f"{line}行目：user_id と期間の2列が必要です。")
+            continue
+        try:
+            start, end = parse_period(row[1])
+        except Exception as e:
+            errors.append(f"{line}行目：日時の解釈に失敗しました（{e}）。")
+            continue
+        rooms.append(RoomRequest(line, int(user_id), start, end))
+    return rooms, errors
+
+
+class VCBatch:
+    """
+    プライベートVCをまとめて作成する。
+    - 権限オーバーライトは共通部分（base_overwrites）を使い回し、部屋ごとに対象ユーザー1人分だけ足す
+    - チャンネル作成はサーバー単位の同じレート制限バケットに入るので、同時実行は concurrency 件まで
+    - ライブラリ側の再試行を使い切った 429 は Retry-After に従って待ち直す
+    """
+
+    def __init__(self, guild, category, base_overwrites: dict, member_overwrite, *, concurrency: int = 3):
+        self.guild = guild
+        self.category = category
+        self.base_overwrites = base_overwrites
+        self.member_overwrite = member_overwrite
+        self.created: list[RoomRequest] = []
+        self.failed: list[RoomRequest] = []
+        self._sem = asyncio.Semaphore(concurrency)
+
+    async def run(self, rooms: list[RoomRequest]):
+        await asyncio.gather(*(self._create(room) for room in rooms))
+
+    async def _create(self, room: RoomRequest):
+        overwrites = {**self.base_overwrites, discord.Object(id=room.user_id): self.member_overwrite}
+        async with self._sem:
+            try:
+                room.channel = await retry_rate_limited(lambda: self.guild.create_voice_channel(
+                    name=room.name,
+                    overwrites=overwrites,
+                    category=self.category,
+                    reason="期間付きプライベートVC（一括作成）",
+                ))
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    room.error = "レート制限により作成できませんでした"
+                else:
+                    room.error = f"{e.status} {e.text}".strip()
+                self.failed.append(room)
+                return
+        self.created.append(room)